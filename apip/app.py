@@ -7,10 +7,10 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
 from colorama import Fore, Style
-from src.storage import firebase_storage
+from src.storage import AUDIO_CODECS, firebase_storage
 import asyncio
 from src.log import setup_logger
 
@@ -112,22 +112,27 @@ async def get_podcasts_by_likes(body: GetPocastsRequest):
 @app.post("/api/get_audio")
 async def get_audio(body: RequestBody):
     logger.info("Getting audio")
-    audio = firebase_storage.get_audio(body.user_id, body.podcast_id)
+    codec = firebase_storage.get_audio_codec(body.user_id, body.podcast_id)
+    audio = firebase_storage.get_audio(body.user_id, body.podcast_id, codec)
     if not audio:
         logger.error("Audio not found")
         name = firebase_storage.get_podcast_name(body.user_id, body.podcast_id)
         subject = firebase_storage.get_podcast_subject(body.user_id, body.podcast_id)
+        # Poll the job of the podcast, only queue a new one if none is queued or running
+        job = await get_audio_job(body.podcast_id)
+        if job is not None and job.get("status") in ("queued", "running"):
+            return JSONResponse(status_code=404, content={"detail": "Audio not found", "job": job})
         if name and subject:
             audio_Petition = AudioRequest(podcast_id=body.podcast_id, user_id=body.user_id, podcast_name=name, subject=subject)
-            await generate_audio(audio_Petition)
-        return JSONResponse(status_code=404, content={"detail": "Audio not found"})
+            job = await generate_audio(audio_Petition)
+        return JSONResponse(status_code=404, content={"detail": "Audio not found", "job": job})
     
     # Ensure the audio is in bytes
     if isinstance(audio, bytes):
         def audio_stream():
             yield audio
         
-        return StreamingResponse(audio_stream(), media_type="audio/mpeg")
+        return StreamingResponse(audio_stream(), media_type=AUDIO_CODECS[codec][1])
     
     else:
         logger.error("Audio is not in bytes format")
@@ -218,11 +223,11 @@ async def generate_podcast(body: GeneratePodcastRequest):
                 logger.error(f"An error occurred while requesting audio: {exc}")
                 raise HTTPException(status_code=500, detail="Error communicating with TTS service")
 
-        if audio_response.status_code != 200:
+        if audio_response.status_code not in (200, 202):
             logger.error(f"Received non-OK response from audio generation: {audio_response.status_code}")
             raise HTTPException(status_code=audio_response.status_code, detail="Error generating audio")
 
-        logger.info("Audio generated successfully")
+        logger.info(f"Audio generation queued: {audio_response.json().get('job_id')}")
 
     # Start the background task
     asyncio.create_task(continue_execution())
@@ -235,6 +240,18 @@ class AudioRequest(BaseModel):
     podcast_name: str
     subject: str
 
+async def get_audio_job(podcast_id: str) -> Optional[Dict]:
+    """The latest audio generation job of a podcast in the TTS service, None if it has none or is unreachable"""
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        try:
+            job_response = await client.get(f"http://{config.TTS_IP}:{config.TTS_Port}/api/podcasts/{podcast_id}/job")
+        except httpx.RequestError as exc:
+            logger.error(f"An error occurred while requesting the audio job: {exc}")
+            return None
+    if job_response.status_code != 200:
+        return None
+    return job_response.json()
+
 @app.post("/api/generate_audio")
 async def generate_audio(body: AudioRequest):
     podcast_id = body.podcast_id
@@ -259,12 +276,12 @@ async def generate_audio(body: AudioRequest):
             logger.error(f"An error occurred while requesting audio: {exc}")
             raise HTTPException(status_code=500, detail="Error communicating with TTS service")
 
-    if audio_response.status_code != 200:
+    if audio_response.status_code not in (200, 202):
         logger.error(f"Received non-OK response from audio generation: {audio_response.status_code}")
         raise HTTPException(status_code=audio_response.status_code, detail="Error generating audio")
 
-    logger.info("Audio generated successfully")
-    return {"podcast_id": podcast_id}
+    logger.info("Audio generation queued")
+    return {"podcast_id": podcast_id, "job_id": audio_response.json().get("job_id")}
 
 @app.post("/api/like_podcast")
 async def like_podcast(body: RequestBody):
@@ -15,6 +15,14 @@ logger = setup_logger("uvicorn")
 FIREBASE_KEY = os.environ.get('FIREBASE_KEY')
 STORAGE_BUCKET = os.getenv('FIREBASE_STORAGE_BUCKET')
 
+# Blob name and content type of every audio rendition written by the TTS service
+AUDIO_CODECS = {
+    'wav': ('audio.wav', 'audio/wav'),
+    'mp3': ('audio.mp3', 'audio/mpeg'),
+    'opus': ('audio.opus', 'audio/ogg'),
+    'aac': ('audio.aac', 'audio/aac'),
+}
+
 
 class FirebaseStorage:
     def __init__(self):
@@ -86,19 +94,27 @@ class FirebaseStorage:
         except NotFound:
             return None
 
-    def get_audio(self, user_id: str, podcast_id: str) -> bytes:
+    def get_audio_codec(self, user_id: str, podcast_id: str) -> str:
+        """Get the default codec of a podcast, podcasts generated before codecs were recorded are .wav"""
+        doc = self.db.collection('podcasts').document(podcast_id).get()
+        if doc.exists:
+            return doc.to_dict().get('codec', 'wav')
+        return 'wav'
+
+    def get_audio(self, user_id: str, podcast_id: str, codec: str = 'wav') -> bytes:
         """
         Descarga un archivo de audio desde Firebase Storage.
 
         Args:
             user_id (str): ID del usuario.
             podcast_id (str): ID del podcast.
+            codec (str): Codec de la versión del audio a descargar.
 
         Returns:
             bytes: El contenido del archivo de audio en bytes, o None si no se encuentra.
         """
         # Crear la ruta del blob con la estructura deseada
-        blob = self.bucket.blob(f'podcasts/{podcast_id}/audio.wav')
+        blob = self.bucket.blob(f'podcasts/{podcast_id}/{AUDIO_CODECS[codec][0]}')
         try:
             return blob.download_as_bytes()
         except NotFound:
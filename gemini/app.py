@@ -1,5 +1,7 @@
+import asyncio
+from contextlib import asynccontextmanager
 from uuid import uuid4
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
 import uvicorn
@@ -8,8 +10,9 @@ from fastapi.responses import JSONResponse
 from src.gemini import PodcastGenerator
 from src.storage import FirebaseStorage
 from src.script_processor import standardize_script_format
-from src.image_generation import generate_image
+from src.image_generation import generate_image, get_image_model
 from src.log import setup_logger
+from src.rate_limit import concurrency_limiter, vertex_limiter
 
 # Configuration
 class Settings(BaseSettings):
@@ -35,8 +38,59 @@ class ScriptResponse(BaseModel):
     message: str
     podcast_id: str
 
+# Shared clients
+WARM_UP_MAX_DELAY = 60
+
+async def warm_up(app: FastAPI):
+    """Create the clients shared by every request, retrying with backoff, the service is ready once they are"""
+    delay = 1
+    while True:
+        try:
+            if app.state.firebase_storage is None:
+                app.state.firebase_storage = await asyncio.to_thread(FirebaseStorage)
+            if app.state.podcast_generator is None:
+                app.state.podcast_generator = await asyncio.to_thread(PodcastGenerator)
+            break
+        except Exception:
+            logger.exception(f"Failed to initialize the clients, retrying in {delay} seconds")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARM_UP_MAX_DELAY)
+    try:
+        await asyncio.to_thread(get_image_model)
+    except Exception:
+        # Not fatal, image generation falls back to the placeholder image
+        logger.exception("Failed to load the image model")
+    app.state.ready = True
+    logger.info("Clients ready")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Starting up the application")
+    app.state.ready = False
+    app.state.firebase_storage = None
+    app.state.podcast_generator = None
+    # Warm up in the background so the process answers probes while the clients are created
+    warm_up_task = asyncio.create_task(warm_up(app))
+    yield
+    logger.info("Shutting down the application")
+    warm_up_task.cancel()
+
+
+def get_firebase_storage(request: Request) -> FirebaseStorage:
+    if not request.app.state.ready:
+        raise HTTPException(status_code=503, detail="Service is not ready")
+    return request.app.state.firebase_storage
+
+
+def get_podcast_generator(request: Request) -> PodcastGenerator:
+    if not request.app.state.ready:
+        raise HTTPException(status_code=503, detail="Service is not ready")
+    return request.app.state.podcast_generator
+
+
 # App initialization
-app = FastAPI(title=settings.app_name)
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
 
 # Exception handlers
 @app.exception_handler(HTTPException)
@@ -53,13 +107,13 @@ async def general_exception_handler(request, exc):
 # Routes
 @app.post("/generate_script", response_model=ScriptResponse)
 async def generate_script(
-    request: PodcastRequest
+    request: PodcastRequest,
+    firebase_storage: FirebaseStorage = Depends(get_firebase_storage),
+    pg: PodcastGenerator = Depends(get_podcast_generator),
 ):
-    firebase_storage = FirebaseStorage()
     logger.info(f"Generating script for subject: {request.subject}")
     try:
         # Generate podcast script
-        pg = PodcastGenerator()
         script = await pg.generate_podcast_script(request.subject)
         if script is None:
             raise ValueError("Script generation failed")
@@ -90,31 +144,32 @@ async def generate_script(
     # Error handling
     except ValueError as ve:
         logger.error(f"Script generation failed: {str(ve)}")
-        await firebase_storage.set_error(request.user_id, podcast_id)
+        await firebase_storage.set_error(request.user_id, request.podcast_id)
         raise HTTPException(status_code=500, detail=str(ve))
 
     except FileNotFoundError as fnfe:
         logger.error(f"File not found: {str(fnfe)}")
-        await firebase_storage.set_error(request.user_id, podcast_id)
+        await firebase_storage.set_error(request.user_id, request.podcast_id)
         raise HTTPException(status_code=500, detail="File not found")
 
     except Exception as e:
         logger.exception("An unexpected error occurred during script generation")
-        await firebase_storage.set_error(request.user_id, podcast_id)
+        await firebase_storage.set_error(request.user_id, request.podcast_id)
         raise HTTPException(status_code=500, detail="An unexpected error occurred during script generation")
 
 
-# Lifecycle events
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Starting up the application")
-    # You can add any startup tasks here, like initializing database connections
+@app.get("/ready")
+async def ready(request: Request):
+    """Readiness probe: 200 once the shared clients are created, 503 until then"""
+    if not request.app.state.ready:
+        return JSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True}
 
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("Shutting down the application")
-    # You can add any cleanup tasks here
+@app.get("/limits")
+async def get_limits():
+    """Current state of the limiters of the calls to the model, for monitoring."""
+    return {"rate": vertex_limiter.stats(), "concurrency": concurrency_limiter.stats()}
 
 
 if __name__ == "__main__":
@@ -1,16 +1,23 @@
 import argparse
+import asyncio
 import json
+import os
 from src.log import setup_logger
 import time
 from typing import Dict, List, Optional, Any
 from pydantic import BaseModel
+from src.rate_limit import call_with_retries
+from src.structured_output import OUTLINE_SCHEMA, SECTION_SCHEMA, parse_outline, parse_section
 
 class PodcastGenerationRequest(BaseModel):
     subject: str
 
 import vertexai
 from vertexai.generative_models import (
+    ChatSession,
+    GenerationConfig,
     GenerativeModel,
+    GenerationResponse,
     SafetySetting,
     HarmCategory,
     HarmBlockThreshold,
@@ -22,14 +29,18 @@ from vertexai.generative_models import (
 PROJECT_ID = "podai-425012"
 LOCATION = "us-central1"
 MODEL_NAME = "gemini-1.5-flash-001"
-MAX_RETRIES = 3
-RETRY_DELAY = 30
+# Sections generated at the same time, 1 generates them one after another in a single chat session
+SECTION_CONCURRENCY = int(os.getenv('GEMINI_SECTION_CONCURRENCY', '4'))
+SECTION_ATTEMPTS = 3
 
 # Model configurations
 GENERATION_CONFIG = {
     "temperature": 0.7,
     "response_mime_type": "application/json",
 }
+# Responses constrained to a schema, so they parse without asking the model again
+OUTLINE_CONFIG = GenerationConfig(**GENERATION_CONFIG, response_schema=OUTLINE_SCHEMA)
+SECTION_CONFIG = GenerationConfig(**GENERATION_CONFIG, response_schema=SECTION_SCHEMA)
 
 SAFETY_SETTINGS = [
     SafetySetting(category=HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, threshold=HarmBlockThreshold.BLOCK_LOW_AND_ABOVE),
@@ -47,7 +58,6 @@ class PodcastGenerator:
         self.initialize_vertexai()
         self.json_model = self.create_model(GENERATION_CONFIG)
         self.main_model = self.create_model(GENERATION_CONFIG)
-        self.chat_session = None
 
     @staticmethod
     def initialize_vertexai():
@@ -62,76 +72,57 @@ class PodcastGenerator:
         )
 
     @staticmethod
-    def retry_operation(func: callable, *args, **kwargs) -> Any:
-        for attempt in range(MAX_RETRIES):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                if attempt < MAX_RETRIES - 1:
-                    # If e contains 429
-                    if "429" in str(e):
-                        logger.warning(f"Rate limit exceeded. Retrying in {RETRY_DELAY} seconds...")
-                        time.sleep(RETRY_DELAY)
-                    else:
-                        raise AIModelError(f"Failed to execute operation: {e}")
-                else:
-                    logger.error(f"Error: Maximum number of attempts reached. {e}")
-                    raise AIModelError(f"Failed to execute operation after {MAX_RETRIES} attempts: {e}")
-        return None
-
-    def generate_content(self, prompt: str) -> Optional[str]:
-        response = self.retry_operation(self.json_model.generate_content, prompt)
-        return response.text.strip() if response else None
+    async def retry_operation(func: callable, *args, **kwargs) -> Any:
+        """Call an async model method through the shared rate limiter, backing off on rate limits without blocking the event loop"""
+        try:
+            return await call_with_retries(func, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error: Failed to execute operation. {e}")
+            raise AIModelError(f"Failed to execute operation: {e}")
+
+    async def generate_content(self, prompt: str, generation_config: Optional[GenerationConfig] = None) -> Optional[str]:
+        response = await self.retry_operation(self.json_model.generate_content_async, prompt, generation_config=generation_config)
+        return self.response_text(response)
 
     @staticmethod
-    def parse_json_response(response: str) -> Optional[Dict]:
+    def response_text(response: Optional[GenerationResponse]) -> Optional[str]:
+        """The text of a response, None if it has none (e.g. blocked by the safety settings)"""
         try:
-            return json.loads(response.replace("```json", "").replace("```", ""))
-        except json.JSONDecodeError:
-            logger.error("Failed to decode JSON response.")
+            return response.text.strip() if response else None
+        except ValueError as e:
+            logger.error(f"Response has no text: {e}")
             return None
 
-    def generate_sections(self, subject: str) -> Optional[List[str]]:
+    async def generate_sections(self, subject: str) -> Optional[List[str]]:
         sections_prompt = f"""
         Generate a detailed outline for a podcast script on the subject "{subject}". 
         The outline should include many fine-grained sections that cover various aspects of the topic comprehensively.
         Provide the output as a JSON array with a string for each section's title.
         """
-        sections_response = self.generate_content(sections_prompt)
-        return self.parse_json_response(sections_response) if sections_response else None
-
-    def generate_script_part(self, message: str) -> Optional[Dict]:
-        format = "Format: {section_title: [{'male_host': '...'}, {'female_host': '...'}, {'male_host': '...'}, {'female_host': '...'}, {'male_host': '...'}, {'female_host': '...'}, ...]}"
-        for _ in range(3):  # Intentar hasta 3 veces
-            response = self.retry_operation(self.chat_session.send_message, message + format)
-            if response and response.text:
-                try:
-                    return self.parse_json_response(response.text)
-                
-                except ValueError:
-                    continue
-        return None
-
-    def generate_detailed_section(self, subject: str, section_title: str) -> Optional[Dict]:
+        sections_response = await self.generate_content(sections_prompt, OUTLINE_CONFIG)
+        return parse_outline(sections_response)
+
+    async def generate_script_part(self, chat_session: ChatSession, message: str) -> Optional[Dict]:
+        response = await self.retry_operation(chat_session.send_message_async, message, generation_config=SECTION_CONFIG)
+        return parse_section(self.response_text(response))
+
+    async def generate_section_part(self, prompt: str) -> Optional[Dict]:
+        """Generate a section from a self-contained prompt, without a chat session"""
+        response = await self.generate_content(prompt, SECTION_CONFIG)
+        return parse_section(response)
+
+    async def generate_detailed_section(self, chat_session: ChatSession, subject: str, section_title: str) -> Optional[Dict]:
         section_prompt = f"""
         Based on the subject "{subject}" and the section title "{section_title}", write a detailed section for a podcast.
         Alternate between Male Host and Female Host. Provide multiple viewpoints, subpoints, and examples. Be simple with your sentences, 
         be aware this will be spoken and it has to sound natural. Male Host has a host role where he usually drives the conversation, while
         Female Host explains and adds more details, but this can be flexible. Conversation needs to be engaging and informative, but not too formal, and natural.
+        Use the section title as the title, and male_host or female_host as the speaker of every line.
         """
-
-        for i in range(3):
-            segment_prompt = f"{section_prompt}\nSegment {i+1}:\nMale Host: (start discussing)\nFemale Host: (continue)\nMale Host: (add more details)"
-            segment_content = self.generate_script_part(segment_prompt)
-            
-            if not segment_content:
-                logger.error("Failed to generate segment content.")
-            else:
-                return segment_content
-            
-        return None
-            
-            
+        section_content = await self.generate_script_part(chat_session, section_prompt)
+        if not section_content:
+            logger.error("Failed to generate section content.")
+        return section_content
 
     async def generate_podcast_script(self, request: str) -> Optional[Dict]:
         subject = request
@@ -139,94 +130,110 @@ class PodcastGenerator:
 
         try:
             logger.info("Generating sections...")
-            sections = self.generate_sections(subject)
+            sections = await self.generate_sections(subject)
             if not sections:
                 logger.error("Failed to generate sections")
                 return None
 
-            self.chat_session = self.main_model.start_chat(history=[])
-
-            logger.info("Generating introduction...")
-            intro_prompt = self.create_intro_prompt(subject, sections)
+            if SECTION_CONCURRENCY > 1:
+                section_contents = await self.generate_sections_concurrently(subject, sections)
+            else:
+                section_contents = await self.generate_sections_in_chat(subject, sections)
+            if section_contents is None:
+                return None
 
-            max_attempts = 3
-            attempts = 0
-            introduction = None
+            # Sections are numbered in outline order, whatever order they were generated in
             full_script = {}
+            for section_number, section_content in enumerate(section_contents, 1):
+                full_script[f"{section_number:03d}_{list(section_content.keys())[0]}"] = list(section_content.values())[0]
 
-            section_number = 1
+            return full_script
+        
+        except Exception as e:
+            logger.exception(f"An error occurred while generating the podcast script: {e}")
+            return None
+
+    async def generate_sections_in_chat(self, subject: str, sections: List[str]) -> Optional[List[Dict]]:
+        """Generate sections one after another in a single chat session, each one seeing the previous ones"""
+        # The session belongs to this script only, the generator is shared by every request
+        chat_session = self.main_model.start_chat(history=[])
 
+        section_contents = []
+        for i, section_title in enumerate(sections, 1):
+            logger.info(f"Generating section {i}...")
+            attempts = 0
+            section_content = None
 
-            """ INTRODUCTION IS AGAIN DONE AS SECTION
-            while attempts < max_attempts:
-                introduction = self.generate_script_part(intro_prompt)
-                if introduction:
+            while attempts < SECTION_ATTEMPTS:
+                section_content = await self.generate_detailed_section(chat_session, subject, section_title)
+                if section_content:
                     break
                 attempts += 1
-                logger.warning(f"Attempt {attempts} failed to generate introduction")
+                logger.warning(f"Attempt {attempts} failed for section {i}. Retrying...")
 
-            if not introduction:
-                logger.error("Failed to generate introduction after 3 attempts")
+            if not section_content:
+                logger.error(f"Failed to generate section {i} after {SECTION_ATTEMPTS} attempts")
                 return None
 
-            introduction = {f"{section_number:03d}_{list(introduction.keys())[0]}": list(introduction.values())[0]}
-            full_script.update(introduction)
-            
-            section_number += 1
-            """
-
-            for i, section_title in enumerate(sections, 1):
-                logger.info(f"Generating section {i}...")
-                attempts = 0
-                max_attempts = 3    # It can fail
-                section_content = None
-
-                while attempts < max_attempts:
-                    section_content = self.generate_detailed_section(subject, section_title)
-                    if section_content:
-                        break
-                    attempts += 1
-                    logger.warning(f"Attempt {attempts} failed for section {i}. Retrying...")
-
-                if not section_content:
-                    logger.error(f"Failed to generate section {i} after {max_attempts} attempts")
-                    return None
+            section_contents.append(section_content)
+        return section_contents
 
-                section_content = {f"{section_number:03d}_{list(section_content.keys())[0]}": list(section_content.values())[0]}
-                full_script.update(section_content)
-                section_number += 1
-
-
-            """
-            logger.info("Generating conclusion...")
-            conclusion_prompt = self.create_conclusion_prompt(subject, sections)
-
-            max_attempts = 3
-            attempts = 0
-            conclusion = None
+    async def generate_sections_concurrently(self, subject: str, sections: List[str]) -> Optional[List[Dict]]:
+        """
+        Generate sections in parallel, at most SECTION_CONCURRENCY at a time.
 
-            while attempts < max_attempts:
-                conclusion = self.generate_script_part(conclusion_prompt)
-                if conclusion:
-                    break
-                attempts += 1
-                logger.warning(f"Attempt {attempts} failed to generate conclusion")
+        Each section gets its own compact context instead of a shared chat history,
+        so script latency follows the slowest section instead of the sum of all of them.
 
-            if not conclusion:
-                logger.error("Failed to generate conclusion after 3 attempts")
+        :param subject: The subject of the podcast.
+        :param sections: The section titles, in order.
+        :return: The content of each section in outline order, or None if a section failed.
+        """
+        semaphore = asyncio.Semaphore(SECTION_CONCURRENCY)
+
+        async def generate(index: int) -> Optional[Dict]:
+            async with semaphore:
+                prompt = self.create_section_prompt(subject, sections, index)
+                for attempt in range(1, SECTION_ATTEMPTS + 1):
+                    logger.info(f"Generating section {index + 1} (attempt {attempt})...")
+                    section_content = await self.generate_section_part(prompt)
+                    if section_content:
+                        return section_content
+                    logger.warning(f"Attempt {attempt} failed for section {index + 1}. Retrying...")
+                logger.error(f"Failed to generate section {index + 1} after {SECTION_ATTEMPTS} attempts")
                 return None
 
-            conclusion = {f"{section_number:03d}_{list(conclusion.keys())[0]}": list(conclusion.values())[0]}
-            full_script.update(conclusion)
-            """
-
-
-            return full_script
-        
-        except Exception as e:
-            logger.exception(f"An error occurred while generating the podcast script: {e}")
-            return None
+        tasks = [asyncio.create_task(generate(index)) for index in range(len(sections))]
+        try:
+            section_contents = []
+            for task in tasks:
+                section_content = await task
+                if section_content is None:
+                    return None
+                section_contents.append(section_content)
+            return section_contents
+        finally:
+            # A failed section fails the script, stop spending calls on the others
+            for task in tasks:
+                task.cancel()
 
+    @staticmethod
+    def create_section_prompt(subject: str, sections: List[str], index: int) -> str:
+        """Self-contained prompt of a section: the subject, the outline and where the section sits in it"""
+        outline = "\n".join(f"{number}. {title}" for number, title in enumerate(sections, 1))
+        previous_section = f'The previous section was "{sections[index - 1]}", do not repeat it and do not greet the listeners again.' if index > 0 else "This is the first section, open the podcast and welcome the listeners."
+        next_section = f'The next section will be "{sections[index + 1]}", do not cover it yet.' if index < len(sections) - 1 else "This is the last section, wrap up the podcast and say goodbye."
+        return f"""
+        Based on the subject "{subject}", write section {index + 1} of {len(sections)} of a podcast, titled "{sections[index]}".
+        Podcast outline:
+        {outline}
+        {previous_section}
+        {next_section}
+        Alternate between Male Host and Female Host. Provide multiple viewpoints, subpoints, and examples. Be simple with your sentences, 
+        be aware this will be spoken and it has to sound natural. Male Host has a host role where he usually drives the conversation, while
+        Female Host explains and adds more details, but this can be flexible. Conversation needs to be engaging and informative, but not too formal, and natural.
+        Use the section title as the title, and male_host or female_host as the speaker of every line.
+        """
 
     @staticmethod
     def create_intro_prompt(subject: str, sections: List[str]) -> str:
@@ -245,7 +252,7 @@ def main():
 
     start_time = time.time()
     try:
-        script = podcast_generator.generate_podcast_script(args.subject)
+        script = asyncio.run(podcast_generator.generate_podcast_script(args.subject))
         if script:
             end_time = time.time()
             logger.info(f"Script generated successfully. Execution time: {end_time - start_time:.2f} seconds")
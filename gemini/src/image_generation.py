@@ -1,9 +1,15 @@
+from functools import lru_cache
 from vertexai.preview.vision_models import Image, ImageGenerationModel
 from PIL import Image as PILImage  # Import the PIL module
 
+@lru_cache(maxsize=1)
+def get_image_model() -> ImageGenerationModel:
+    """The image model is loaded once and shared by every request"""
+    return ImageGenerationModel.from_pretrained("imagegeneration@005")
+
 def generate_image(name: str):
     try:
-        img_generation_model = ImageGenerationModel.from_pretrained("imagegeneration@005")
+        img_generation_model = get_image_model()
         
         prompt = f"High resolution image of {name}"
         images = img_generation_model.generate_images(
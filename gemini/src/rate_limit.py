@@ -0,0 +1,251 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+from google.api_core import exceptions as api_exceptions
+
+from src.log import setup_logger
+
+logger = setup_logger("uvicorn")
+
+# Vertex AI quota shared by every request of the process
+REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '60'))
+REQUEST_BURST = int(os.getenv('GEMINI_REQUEST_BURST', '5'))
+
+# Retries of rate limited and transient errors
+RETRY_ATTEMPTS = int(os.getenv('GEMINI_RETRY_ATTEMPTS', '5'))
+RETRY_BASE_DELAY = float(os.getenv('GEMINI_RETRY_BASE_DELAY', '2'))
+RETRY_MAX_DELAY = float(os.getenv('GEMINI_RETRY_MAX_DELAY', '30'))
+
+# Adaptive limit of calls in flight: grows by one per window of successes, halves on rate limits or latency spikes
+CONCURRENCY_INITIAL = float(os.getenv('GEMINI_CONCURRENCY_INITIAL', '4'))
+CONCURRENCY_MIN = float(os.getenv('GEMINI_CONCURRENCY_MIN', '1'))
+CONCURRENCY_MAX = float(os.getenv('GEMINI_CONCURRENCY_MAX', '32'))
+CONCURRENCY_DECREASE = float(os.getenv('GEMINI_CONCURRENCY_DECREASE', '0.5'))
+LATENCY_SPIKE_FACTOR = float(os.getenv('GEMINI_LATENCY_SPIKE_FACTOR', '3'))
+# Callers allowed to wait for a slot, further calls are rejected instead of piling up
+CONCURRENCY_MAX_QUEUE = int(os.getenv('GEMINI_CONCURRENCY_MAX_QUEUE', '200'))
+
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+)
+
+
+class TokenBucket:
+    """
+    Process-wide token bucket: callers wait for capacity instead of sending requests the quota will reject.
+
+    Tokens refill continuously at `rate` per second, up to `burst` tokens.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.waiting = 0
+        self._lock = None
+        self._loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio primitives bind to the loop they are created in before Python 3.10,
+        # so the lock is built in the loop that uses it rather than when the module is imported
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        return self._lock
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        self.waiting += 1
+        try:
+            # The lock makes callers wait their turn, the first one in line sleeps until its token is there
+            async with self._get_lock():
+                self._refill()
+                if self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    self._refill()
+                self.tokens -= 1
+        finally:
+            self.waiting -= 1
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "requests_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "available": round(self.tokens, 2),
+            "waiting": self.waiting,
+        }
+
+
+class LimiterRejected(Exception):
+    """Raised when too many calls are already waiting for the concurrency limiter."""
+    pass
+
+
+class AdaptiveLimiter:
+    """
+    Limit of concurrent calls that follows the quota with additive increase, multiplicative decrease (AIMD).
+
+    Every success grows the limit by 1/limit, so about one slot per window of successful calls.
+    A rate limit or a call much slower than usual cuts the limit by CONCURRENCY_DECREASE,
+    at most once per typical call latency so a burst of failures of the same calls counts once.
+    """
+
+    def __init__(self, initial: float, minimum: float, maximum: float, decrease: float, max_queue: int):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.max_queue = max_queue
+        self.inflight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.successes = 0
+        self.throttled = 0
+        self.latency_spikes = 0
+        self.latency = None  # Moving average of the latency of successful calls, in seconds
+        self._last_decrease = 0.0
+        self._condition = None
+        self._loop = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Built in the loop that uses it, like the token bucket lock
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition, self._loop = asyncio.Condition(), loop
+        return self._condition
+
+    async def acquire(self) -> None:
+        """
+        Wait for a free slot.
+
+        :raises LimiterRejected: If too many calls are already waiting.
+        """
+        condition = self._get_condition()
+        async with condition:
+            if self.inflight >= int(self.limit) and self.queued >= self.max_queue:
+                self.rejected += 1
+                raise LimiterRejected(f"{self.queued} calls are already waiting for the model")
+            self.queued += 1
+            try:
+                await condition.wait_for(lambda: self.inflight < int(self.limit))
+            finally:
+                self.queued -= 1
+            self.inflight += 1
+
+    async def release(self, latency: float, rate_limited: bool = False, failed: bool = False) -> None:
+        """
+        Free a slot and adapt the limit to how the call went.
+
+        :param latency: How long the call took, in seconds.
+        :param rate_limited: Whether the call was rejected by the quota.
+        :param failed: Whether the call failed for another reason, which does not change the limit.
+        """
+        condition = self._get_condition()
+        async with condition:
+            self.inflight -= 1
+            if rate_limited:
+                self.throttled += 1
+                self._decrease()
+            elif not failed:
+                self.successes += 1
+                if self.latency is not None and self.successes > 10 and latency > self.latency * LATENCY_SPIKE_FACTOR:
+                    self.latency_spikes += 1
+                    self._decrease()
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+            condition.notify_all()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        logger.warning(f"Reduced the model concurrency limit to {self.limit:.1f}")
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "latency_spikes": self.latency_spikes,
+            "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+        }
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return isinstance(error, (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)) or "429" in str(error)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits and transient server errors are worth retrying, anything else is not."""
+    return isinstance(error, RETRYABLE_ERRORS) or "429" in str(error)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, so retrying callers do not come back all at once."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+async def call_limited(func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    """
+    Call an async API function in a slot of the adaptive concurrency limiter, reporting how it went.
+
+    :param func: The async function to call.
+    :return: The result of the function.
+    """
+    await concurrency_limiter.acquire()
+    start_time = time.monotonic()
+    try:
+        result = await func(*args, **kwargs)
+    except Exception as e:
+        await concurrency_limiter.release(time.monotonic() - start_time, rate_limited=is_rate_limited(e), failed=True)
+        raise
+    await concurrency_limiter.release(time.monotonic() - start_time)
+    return result
+
+
+async def call_with_retries(func: Callable[..., Awaitable[Any]], *args, limiter: "TokenBucket" = None, **kwargs) -> Any:
+    """
+    Call an async API function through the rate and concurrency limiters, retrying rate limited and transient errors.
+
+    :param func: The async function to call.
+    :param limiter: The token bucket to wait on, the process-wide one by default.
+    :return: The result of the function.
+    :raises Exception: The last error, if every attempt failed or the error is not retryable.
+    """
+    limiter = limiter or vertex_limiter
+    for attempt in range(RETRY_ATTEMPTS):
+        await limiter.acquire()
+        try:
+            return await call_limited(func, *args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e) or attempt == RETRY_ATTEMPTS - 1:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Retryable error ({e}). Retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+
+
+vertex_limiter = TokenBucket(REQUESTS_PER_MINUTE / 60, REQUEST_BURST)
+concurrency_limiter = AdaptiveLimiter(
+    CONCURRENCY_INITIAL, CONCURRENCY_MIN, CONCURRENCY_MAX, CONCURRENCY_DECREASE, CONCURRENCY_MAX_QUEUE,
+)
@@ -30,10 +30,6 @@ class FirebaseStorage:
         self.bucket = storage.bucket()
         self.db = firestore.client()
 
-        # get all elements from collection podcasts and add update them so they inlcude the fields (if they dont have them already) "likes: 0" and "liked_by: []", 
-        # created_at: timestamp (1 of january of 1970), druration: 1000
-        podcasts = self.db.collection('podcasts').stream()
-
     async def save_podcast(self, user_id: str, podcast_id: str, script_content: Dict):
         """Save podcast details to Firestore"""
         try:
@@ -76,7 +72,7 @@ class FirebaseStorage:
             image.save("output_{}.png".format(i))
         """
 
-    def set_error(self, user_id: str, podcast_id: str):
+    async def set_error(self, user_id: str, podcast_id: str):
         """Set podcast status to error"""
         doc_ref = self.db.collection('podcasts').document(podcast_id)
         doc_ref.update({'status': 'error'})
@@ -0,0 +1,224 @@
+import ast
+import json
+from typing import Annotated, Any, Iterator, List, Literal, Optional
+
+from pydantic import BaseModel, BeforeValidator, TypeAdapter, ValidationError, model_validator
+
+from src.log import setup_logger
+from src.script_processor import SPEAKER_MAPPING
+
+logger = setup_logger("uvicorn")
+
+# Response schemas given to the model (OpenAPI subset understood by Vertex AI)
+OUTLINE_SCHEMA = {
+    "type": "array",
+    "items": {"type": "string"},
+}
+
+SECTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "dialogue": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "speaker": {"type": "string", "enum": ["male_host", "female_host"]},
+                    "text": {"type": "string"},
+                },
+                "required": ["speaker", "text"],
+            },
+        },
+    },
+    "required": ["title", "dialogue"],
+}
+
+
+class DialogueLine(BaseModel):
+    speaker: Literal["male_host", "female_host"]
+    text: str
+
+    @model_validator(mode="before")
+    @classmethod
+    def from_speaker_key(cls, data: Any) -> Any:
+        """Accept {"male_host": "..."} lines and loosely named speakers"""
+        if isinstance(data, dict):
+            if "speaker" not in data and len(data) == 1:
+                speaker, text = next(iter(data.items()))
+                data = {"speaker": speaker, "text": text}
+            if isinstance(data.get("speaker"), str):
+                data = {**data, "speaker": SPEAKER_MAPPING.get(data["speaker"].strip(), data["speaker"])}
+        return data
+
+
+class Section(BaseModel):
+    title: str
+    dialogue: List[DialogueLine]
+
+    @model_validator(mode="before")
+    @classmethod
+    def from_title_key(cls, data: Any) -> Any:
+        """Accept the {section_title: [lines]} format of the prose prompts"""
+        if isinstance(data, dict) and "dialogue" not in data and len(data) == 1:
+            title, dialogue = next(iter(data.items()))
+            if isinstance(dialogue, list):
+                return {"title": title, "dialogue": dialogue}
+        return data
+
+    def to_script(self) -> dict:
+        """The section in the script format: {section_title: [{speaker: text}, ...]}"""
+        return {self.title: [{line.speaker: line.text} for line in self.dialogue if line.text.strip()]}
+
+
+def unwrap_outline(data: Any) -> Any:
+    """Accept {"sections": [...]} outlines and {"title": ...} items"""
+    if isinstance(data, dict) and len(data) == 1:
+        data = next(iter(data.values()))
+    if isinstance(data, list):
+        data = [item.get("title", item) if isinstance(item, dict) else item for item in data]
+    return data
+
+
+# Validators are built once and reused for every response
+outline_adapter = TypeAdapter(Annotated[List[str], BeforeValidator(unwrap_outline)])
+section_adapter = TypeAdapter(Section)
+
+
+def strip_code_fences(text: str) -> str:
+    return text.replace("```json", "").replace("```", "").strip()
+
+
+def close_json(text: str) -> Iterator[str]:
+    """
+    Complete JSON that was cut off or slightly malformed.
+
+    Trailing commas are dropped and open arrays and objects are closed.
+    Candidates are the text completed as is, and the text cut after the last complete array or object,
+    which drops a half-written trailing element. Text cut off inside a string drops the element holding
+    the string instead of closing it, the whole object if the string is in an object within an array,
+    so a line truncated mid-word is dropped rather than read aloud.
+
+    :param text: The JSON text, starting at its first bracket.
+    :return: The completed candidates, best first.
+    """
+    output = []
+    stack = []
+    element_starts = []  # Length of the output at the start of the current element of every open bracket
+    cut_points = []  # (length of the output, open brackets) after every closed array or object
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            output.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            output.append(char)
+            element_starts.append(len(output))
+            continue
+        elif char == "," and stack:
+            output.append(char)
+            element_starts[-1] = len(output)
+            continue
+        elif char in "}]":
+            while output and output[-1] in " \t\r\n,":
+                output.pop()
+            if not stack:
+                break
+            char = stack.pop()
+            element_starts.pop()
+            output.append(char)
+            cut_points.append((len(output), list(stack)))
+            if not stack:
+                break
+            continue
+        output.append(char)
+
+    cut = None
+    if cut_points and (stack or in_string):
+        length, open_brackets = cut_points[-1]
+        cut = "".join(output[:length]) + "".join(reversed(open_brackets))
+
+    if in_string:
+        if not stack:
+            return
+        # A string in an object within another bracket drops the object, otherwise the element holding it
+        depth = len(stack) - 1 if stack[-1] == "]" or len(stack) == 1 else len(stack) - 2
+        dropped = "".join(output[:element_starts[depth]]).rstrip(" \t\r\n,:") + "".join(reversed(stack[:depth + 1]))
+        yield dropped
+        if cut is not None and cut != dropped:
+            yield cut
+        return
+
+    yield "".join(output).rstrip(" \t\r\n,:") + "".join(reversed(stack))
+    if cut is not None:
+        yield cut
+
+
+def repair_candidates(text: str) -> Iterator[Any]:
+    """Values that malformed model output most likely meant, best first"""
+    text = strip_code_fences(text)
+    starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+    if not starts:
+        return
+    text = text[min(starts):]
+    for candidate in close_json(text):
+        try:
+            yield json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+    # Dicts written with single quotes, as in Python
+    try:
+        yield ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+
+
+def parse_structured(text: Optional[str], adapter: TypeAdapter) -> Optional[Any]:
+    """
+    Validate a structured response, repairing it locally if needed instead of asking the model again.
+
+    :param text: The response text.
+    :param adapter: The validator of the expected type.
+    :return: The validated value, or None if the response could not be repaired.
+    """
+    if not text:
+        return None
+    try:
+        return adapter.validate_json(text)
+    except ValidationError:
+        pass
+    for candidate in repair_candidates(text):
+        try:
+            value = adapter.validate_python(candidate)
+        except ValidationError:
+            continue
+        logger.warning("Repaired a malformed structured response")
+        return value
+    logger.error(f"Failed to parse structured response: {text[:200]}")
+    return None
+
+
+def parse_outline(text: Optional[str]) -> Optional[List[str]]:
+    """The section titles of an outline response, or None if it could not be repaired or is empty"""
+    outline = parse_structured(text, outline_adapter)
+    if outline is None:
+        return None
+    return [title for title in outline if title.strip()] or None
+
+
+def parse_section(text: Optional[str]) -> Optional[dict]:
+    """A section response in the script format, or None if it could not be repaired or has no lines"""
+    section = parse_structured(text, section_adapter)
+    if section is None:
+        return None
+    script = section.to_script()
+    return script if script[section.title] else None
@@ -1,10 +1,16 @@
 # app.py
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 from src.log import setup_logger
-from src.audio import generate_podcast
+from src.jobs import JobQueueFull, job_manager
 from src.models import Podcast
-from src.storage import FirebaseStorage
+from src.storage import AUDIO_CODECS, FirebaseStorage
+from src.cache import audio_cache, sentence_cache
+from src.delivery import blob_response, file_response, is_not_modified, validator_headers
+from src.intros import intro_bank
+from src.synthesis import synthesis_engine
+from src.streaming import stream_podcast
+import json
 import os
 
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
@@ -19,35 +25,108 @@ if not os.path.exists("voices"):
 if not os.listdir("voices"):
     firebase_storage.download_voices()
 
-@app.post("/api/audio")
+logger.info(f"Synthesis layout: {json.dumps(synthesis_engine.layout())}")
+synthesis_engine.start()
+intro_bank.load()
+
+@app.post("/api/audio", status_code=202)
 async def read_audio(podcast: Podcast):
     if not podcast.user_id or not podcast.podcast_id or not podcast.podcast_name:
         logger.error(f"Invalid request body: {podcast}")
         raise HTTPException(status_code=400, detail="Invalid request body")
 
-    logger.info("Generating podcast")
+    logger.info("Queueing podcast")
 
     try:
-        generate_podcast(podcast)
-    except Exception as e:
-        logger.error(f"Error generating podcast: {e}")
-        firebase_storage.set_error(podcast.user_id, podcast.podcast_id)
-        raise HTTPException(status_code=500, detail="Error generating podcast")
-
-    audio = firebase_storage.get_audio(podcast.user_id, podcast.podcast_id)
-    if audio is None:
-        logger.error(f"Podcast not found: {podcast.podcast_id}")
-        firebase_storage.set_error(podcast.user_id, podcast.podcast_id)
+        job = job_manager.submit(podcast)
+    except JobQueueFull as e:
+        logger.warning(f"Rejecting podcast {podcast.podcast_id}: {e}")
+        raise HTTPException(status_code=503, detail="Too many podcasts in queue", headers={"Retry-After": "30"})
+
+    return {"response_code": 202, "message": "Podcast generation queued", "job_id": job.job_id, "podcast": podcast}
+
+@app.get("/api/jobs")
+def read_jobs():
+    return {**job_manager.stats(), "jobs": [job.to_dict() for job in job_manager.list()]}
+
+@app.get("/api/runtime")
+def read_runtime():
+    return {"layout": synthesis_engine.layout(), "voices": synthesis_engine.voice_stats()}
+
+@app.get("/api/scheduler")
+def read_scheduler():
+    return synthesis_engine.scheduler.stats()
+
+@app.get("/api/jobs/{job_id}")
+def read_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/podcasts/{podcast_id}/job")
+def read_podcast_job(podcast_id: str):
+    job = job_manager.find(podcast_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/stream/{user_id}/{podcast_id}")
+def stream_audio(user_id: str, podcast_id: str):
+    job = job_manager.find(podcast_id)
+    if job is None or job.status == "done":
+        return RedirectResponse(url=f"/audio/{user_id}/{podcast_id}")
+    if job.status == "error":
         raise HTTPException(status_code=404, detail="Podcast not found")
+    if job.progress.finished and not job.progress.listeners:
+        # Synthesis is over and the podcast is being finalized, it can be fetched as a whole shortly
+        raise HTTPException(status_code=409, detail="Podcast is being finalized", headers={"Retry-After": "5"})
+
+    logger.info(f"Streaming podcast: {podcast_id} for user: {user_id}")
+    return StreamingResponse(stream_podcast(job.progress), media_type="audio/wav")
 
-    return {"response_code": 200, "message": "Podcast generated successfully", "podcast": podcast}
+@app.get("/api/voices")
+def read_voices():
+    return synthesis_engine.voice_stats()
+
+@app.get("/api/cache")
+def read_cache():
+    return {
+        "sentences": sentence_cache.stats() if sentence_cache is not None else {"enabled": False},
+        "audio": audio_cache.stats() if audio_cache is not None else {"enabled": False},
+    }
 
 @app.get("/audio/{user_id}/{podcast_id}")
-def read_audio(user_id: str, podcast_id: str):
+def read_audio(request: Request, user_id: str, podcast_id: str):
     logger.info(f"Retrieving podcast: {podcast_id} for user: {user_id}")
-    audio = firebase_storage.get_audio(user_id, podcast_id)
-    if audio is None:
+    codec = firebase_storage.get_audio_codec(user_id, podcast_id)
+    blob = firebase_storage.get_audio_blob(user_id, podcast_id, codec)
+    if blob is None:
         logger.error(f"Podcast not found: {podcast_id}")
         firebase_storage.set_error(user_id, podcast_id)
         raise HTTPException(status_code=404, detail="Podcast not found")
-    return Response(content=audio, media_type="audio/wav")
\ No newline at end of file
+
+    media_type = AUDIO_CODECS[codec][1]
+    etag = f'"{blob.etag}"'
+    if is_not_modified(request, etag, blob.updated):
+        return Response(status_code=304, headers=validator_headers(etag, blob.updated))
+
+    # Serve from the local disk tier, downloading the podcast once per storage generation.
+    # A file evicted between the lookup and opening it is a cache miss.
+    if audio_cache is not None:
+        key = f"{podcast_id}.{blob.generation}.{codec}"
+        path = audio_cache.get_path(key)
+        response = file_response(request, path, media_type, etag, blob.updated) if path else None
+        if response is None:
+            logger.debug(f"Caching podcast {podcast_id} on local disk")
+            path = audio_cache.put_file(key, blob.download_to_filename)
+            response = file_response(request, path, media_type, etag, blob.updated) if path else None
+        if response is not None:
+            return response
+
+    return blob_response(request, blob, media_type, etag, blob.updated)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    job_manager.shutdown()
+    synthesis_engine.shutdown()
@@ -0,0 +1,83 @@
+# scripts/benchmark_batching.py
+#
+# Compare batched ONNX inference against one sentence per call for a voice.
+#
+# Usage (from the tts folder): python -m scripts.benchmark_batching male --sentences 64 --batch-sizes 1 4 8 16
+
+import argparse
+import json
+import time
+import wave
+from io import BytesIO
+from typing import List
+
+import piper
+
+from src.batching import synthesize_batch
+from src.voices import voices
+
+SAMPLE_SENTENCES = [
+    "Welcome back to the show.",
+    "That's a great question.",
+    "So let's start with the basics of how it all began, and why it still matters today.",
+    "Exactly.",
+    "Many people assume it happened overnight, but it actually took decades of small improvements.",
+    "Right, and that's where it gets interesting.",
+    "Think about the first time you used one, what did it feel like?",
+    "Honestly, a little confusing at first.",
+]
+
+
+def audio_seconds(wav_files: List[bytes]) -> float:
+    seconds = 0.0
+    for wav_data in wav_files:
+        with wave.open(BytesIO(wav_data), 'rb') as wav:
+            seconds += wav.getnframes() / wav.getframerate()
+    return seconds
+
+
+def per_sentence(voice: piper.PiperVoice, sentences: List[str]) -> List[bytes]:
+    wav_files = []
+    for sentence in sentences:
+        buffer = BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            voice.synthesize(sentence, wav)
+        wav_files.append(buffer.getvalue())
+    return wav_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batched against per-sentence synthesis.')
+    parser.add_argument('voice', choices=list(voices), help='The voice to benchmark')
+    parser.add_argument('--sentences', type=int, default=64, help='Number of sentences to synthesize')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[4, 8, 16], help='Batch sizes to try')
+    parser.add_argument('--padding', choices=['sorted', 'fifo'], nargs='+', default=['sorted', 'fifo'])
+    args = parser.parse_args()
+
+    voice = piper.PiperVoice.load(voices[args.voice][0], voices[args.voice][1])
+    sentences = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] for i in range(args.sentences)]
+    per_sentence(voice, sentences[:2])  # Warm up
+
+    results = []
+
+    start_time = time.time()
+    seconds = audio_seconds(per_sentence(voice, sentences))
+    elapsed = time.time() - start_time
+    results.append({"mode": "per_sentence", "seconds": round(elapsed, 3), "rtf": round(elapsed / seconds, 4)})
+
+    for padding in args.padding:
+        for batch_size in args.batch_sizes:
+            start_time = time.time()
+            seconds = audio_seconds(synthesize_batch(voice, sentences, batch_size, padding))
+            elapsed = time.time() - start_time
+            results.append({
+                "mode": f"batch_{batch_size}_{padding}",
+                "seconds": round(elapsed, 3),
+                "rtf": round(elapsed / seconds, 4),
+            })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
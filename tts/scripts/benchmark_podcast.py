@@ -0,0 +1,232 @@
+# scripts/benchmark_podcast.py
+#
+# Measure end-to-end podcast generation offline: synthetic scripts, the real voices, and a local
+# directory instead of Firebase. Results are written as JSON so regressions can be tracked.
+#
+# Usage (from the tts folder): python -m scripts.benchmark_podcast --lines 200 --runs 3 --output benchmark.json
+
+import os
+import tempfile
+
+# The storage backend is chosen when src.audio is imported, point it at a scratch directory first
+STORAGE_DIR = tempfile.mkdtemp(prefix='podai-benchmark-')
+os.environ['TTS_STORAGE_BACKEND'] = 'local'
+os.environ['TTS_LOCAL_STORAGE_DIR'] = STORAGE_DIR
+# Every run synthesizes from scratch unless asked otherwise
+os.environ.setdefault('TTS_CACHE_ENABLED', 'false')
+os.environ.setdefault('TTS_CHECKPOINT_ENABLED', 'false')
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+import psutil
+
+from src import audio
+from src.batching import BATCH_SIZE
+from src.intros import intro_bank
+from src.models import Podcast
+from src.progress import PodcastProgress
+from src.scheduler import percentile
+from src.synthesis import synthesis_engine
+
+WORDS = (
+    "the of and to in is that it for was on are as with they be at one have this from or had by word but "
+    "what some we can out other were all there when up use your how said an each she which do their time "
+    "if will way about many then them write would like so these her long make thing see him two has look "
+    "more day could go come did number sound no most people my over know water than call first who may down "
+    "side been now find any new work part take get place made live where after back little only round man "
+    "year came show every good me give our under name very through just form sentence great think say help"
+).split()
+
+
+def synthetic_script(lines: int, sections: int, min_words: int, max_words: int, seed: int) -> Dict[str, List[Dict]]:
+    """
+    Build a script in the format stored by the Gemini service, alternating hosts.
+
+    :param lines: The number of lines.
+    :param sections: The number of sections the lines are spread over.
+    :param min_words: The minimum number of words per line.
+    :param max_words: The maximum number of words per line.
+    :param seed: The random seed, the same seed always gives the same script.
+    :return: The script.
+    """
+    rng = random.Random(seed)
+    script = {}
+    per_section = max(1, lines // max(1, sections))
+    for line in range(lines):
+        section = f"{min(line // per_section, sections - 1) + 1:03d}_Section"
+        words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+        sentence = ' '.join(words).capitalize() + rng.choice(['.', '.', '.', '?', '!'])
+        host = 'male_host' if line % 2 == 0 else 'female_host'
+        script.setdefault(section, []).append({host: sentence})
+    return script
+
+
+class TimedProgress(PodcastProgress):
+    """Progress that remembers when every stage started."""
+
+    def __init__(self):
+        super().__init__()
+        self.stage_times = {}
+
+    def set_stage(self, stage: str) -> None:
+        self.stage_times.setdefault(stage, time.time())
+        super().set_stage(stage)
+
+
+class PeakMemory:
+    """Samples the resident memory of this process and its synthesis workers in the background."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        process = psutil.Process()
+        while not self._stop.is_set():
+            rss = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakMemory":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def timed(function, durations: List[float]):
+    def wrapper(*args, **kwargs):
+        start_time = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            durations.append(time.time() - start_time)
+    return wrapper
+
+
+def run(storage, script: Dict, run_index: int) -> Dict:
+    """
+    Generate a podcast from a script and measure it.
+
+    :param storage: The local storage backend.
+    :param script: The script.
+    :param run_index: The index of the run, names the podcast.
+    :return: The measurements of the run.
+    """
+    podcast_id = f"benchmark-{run_index}"
+    storage.save_script('benchmark', podcast_id, script)
+    lines = sum(len(section) for section in script.values())
+
+    concat_durations, export_durations = [], []
+    concatenate_audio_files, export_audio = audio.concatenate_audio_files, audio.export_audio
+    audio.concatenate_audio_files = timed(concatenate_audio_files, concat_durations)
+    audio.export_audio = timed(export_audio, export_durations)
+    synthesis_engine.scheduler.latencies.clear()
+
+    progress = TimedProgress()
+    try:
+        with PeakMemory() as memory:
+            start_time = time.time()
+            audio.generate_podcast(Podcast(user_id='benchmark', podcast_name=podcast_id, podcast_id=podcast_id), progress)
+            total_seconds = time.time() - start_time
+    finally:
+        audio.concatenate_audio_files, audio.export_audio = concatenate_audio_files, export_audio
+
+    document = storage.get_document(podcast_id) or {}
+    if document.get('status') != 'ready':
+        raise RuntimeError(f"Podcast {podcast_id} was not generated, see the log above")
+
+    synthesis_start = progress.stage_times.get('synthesizing', start_time)
+    synthesis_seconds = progress.stage_times.get('assembling', start_time + total_seconds) - synthesis_start
+    latencies = sorted(synthesis_engine.scheduler.latencies)
+    return {
+        "lines": lines,
+        "audio_seconds": round(document['duration'], 3),
+        "total_seconds": round(total_seconds, 3),
+        "synthesis_seconds": round(synthesis_seconds, 3),
+        "concat_seconds": round(sum(concat_durations), 3),
+        "export_seconds": round(sum(export_durations), 3),
+        "sentences_per_second": round(lines / synthesis_seconds, 2) if synthesis_seconds else None,
+        "rtf": round(total_seconds / document['duration'], 4),
+        "synthesis_rtf": round(synthesis_seconds / document['duration'], 4),
+        "latency_p50": round(percentile(latencies, 50), 4),
+        "latency_p99": round(percentile(latencies, 99), 4),
+        "peak_rss_mb": round(memory.peak / (1024 * 1024), 1),
+        "output_size": document.get('size'),
+    }
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    """The median of every measurement over the runs."""
+    return {
+        key: round(statistics.median(run[key] for run in runs), 4)
+        for key in runs[0] if all(isinstance(run[key], (int, float)) for run in runs)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark podcast generation without Firebase.')
+    parser.add_argument('--lines', type=int, default=200, help='Lines of the synthetic script')
+    parser.add_argument('--sections', type=int, default=5, help='Sections of the synthetic script')
+    parser.add_argument('--min-words', type=int, default=4, help='Minimum words per line')
+    parser.add_argument('--max-words', type=int, default=30, help='Maximum words per line')
+    parser.add_argument('--runs', type=int, default=3, help='Measured runs, after one warm-up run')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic script')
+    parser.add_argument('--output', help='Write the results to this JSON file as well')
+    args = parser.parse_args()
+
+    try:
+        synthesis_engine.start()
+        intro_bank.load()
+        storage = audio.firebase_storage
+        script = synthetic_script(args.lines, args.sections, args.min_words, args.max_words, args.seed)
+
+        # Start the synthesis pool and warm its sessions before measuring
+        run(storage, synthetic_script(8, 1, args.min_words, args.max_words, args.seed), 0)
+        runs = [run(storage, script, index + 1) for index in range(args.runs)]
+
+        results = {
+            "config": {
+                "lines": args.lines,
+                "sections": args.sections,
+                "words_per_line": [args.min_words, args.max_words],
+                "seed": args.seed,
+                "layout": synthesis_engine.layout(),
+                "batch_size": BATCH_SIZE,
+                "assembly_mode": audio.ASSEMBLY_MODE,
+                "audio_store": audio.AUDIO_STORE,
+                "voices": synthesis_engine.voice_stats(),
+                "python": platform.python_version(),
+            },
+            "runs": runs,
+            "median": summarize(runs),
+        }
+    finally:
+        synthesis_engine.shutdown()
+        shutil.rmtree(STORAGE_DIR, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# scripts/quantize_voices.py
+#
+# Make dynamic-quantized int8 variants of the voice models, and compare them with the float models.
+# Select them with TTS_VOICE_VARIANTS, e.g. TTS_VOICE_VARIANTS=int8 or TTS_VOICE_VARIANTS=male:int8.
+#
+# Usage (from the tts folder): python -m scripts.quantize_voices male female --report
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+import piper
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from src.voices import variant_path, voices
+
+REPORT_SENTENCES = [
+    "Welcome back to the show.",
+    "So let's start with the basics of how it all began, and why it still matters today.",
+    "Many people assume it happened overnight, but it actually took decades of small improvements.",
+    "Think about the first time you used one, what did it feel like?",
+]
+FRAME_SIZE = 1024
+
+
+def quantize(voice_type: str, variant: str, per_channel: bool) -> str:
+    """
+    Write the int8 variant of a voice model next to it.
+
+    :param voice_type: The type of voice ("male" or "female").
+    :param variant: The name of the variant, used in the file name.
+    :param per_channel: Quantize weights per channel, slower to make but usually closer to the float model.
+    :return: The path of the quantized model.
+    """
+    model_path = voices[voice_type][0]
+    output_path = variant_path(model_path, variant)
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QUInt8, per_channel=per_channel)
+    return output_path
+
+
+def synthesize(voice: piper.PiperVoice, sentences: List[str]) -> List[np.ndarray]:
+    """Synthesize without noise so both models get the exact same input."""
+    return [
+        np.frombuffer(b''.join(voice.synthesize_stream_raw(sentence, noise_scale=0.0, noise_w=0.0)), dtype='<i2')
+        for sentence in sentences
+    ]
+
+
+def log_spectrum(samples: np.ndarray) -> np.ndarray:
+    frames = len(samples) // FRAME_SIZE
+    if frames == 0:
+        return np.zeros((0, FRAME_SIZE // 2 + 1))
+    windows = samples[:frames * FRAME_SIZE].reshape(frames, FRAME_SIZE).astype(np.float32) * np.hanning(FRAME_SIZE)
+    return np.log1p(np.abs(np.fft.rfft(windows, axis=1)))
+
+
+def similarity(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """
+    Cosine similarity of the log spectrograms of two renditions of a sentence, 1.0 is identical.
+
+    Durations may differ slightly, the longer rendition is truncated.
+    """
+    reference, candidate = log_spectrum(reference), log_spectrum(candidate)
+    frames = min(len(reference), len(candidate))
+    if frames == 0:
+        return 0.0
+    reference, candidate = reference[:frames].ravel(), candidate[:frames].ravel()
+    return float(np.dot(reference, candidate) / (np.linalg.norm(reference) * np.linalg.norm(candidate) + 1e-9))
+
+
+def measure(voice: piper.PiperVoice, sentences: List[str]):
+    synthesize(voice, sentences[:1])  # Warm up
+    start_time = time.time()
+    audio = synthesize(voice, sentences)
+    elapsed = time.time() - start_time
+    seconds = sum(len(samples) for samples in audio) / voice.config.sample_rate
+    return audio, elapsed / seconds if seconds else 0.0
+
+
+def report(voice_type: str, variant: str, repeats: int) -> Dict:
+    """
+    Compare the real-time factor and output of a voice's float and quantized models.
+
+    :param voice_type: The type of voice ("male" or "female").
+    :param variant: The quantized variant.
+    :param repeats: How many times the report sentences are synthesized.
+    :return: The report of the voice.
+    """
+    model_path, config_path = voices[voice_type]
+    quantized_path = variant_path(model_path, variant)
+    sentences = REPORT_SENTENCES * repeats
+
+    float_audio, float_rtf = measure(piper.PiperVoice.load(model_path, config_path), sentences)
+    quantized_audio, quantized_rtf = measure(piper.PiperVoice.load(quantized_path, config_path), sentences)
+
+    float_samples = sum(len(samples) for samples in float_audio)
+    quantized_samples = sum(len(samples) for samples in quantized_audio)
+    return {
+        "voice": voice_type,
+        "variant": variant,
+        "float_size_mb": round(os.path.getsize(model_path) / (1024 * 1024), 1),
+        "quantized_size_mb": round(os.path.getsize(quantized_path) / (1024 * 1024), 1),
+        "float_rtf": round(float_rtf, 4),
+        "quantized_rtf": round(quantized_rtf, 4),
+        "speedup": round(float_rtf / quantized_rtf, 2) if quantized_rtf else None,
+        "duration_ratio": round(quantized_samples / float_samples, 3) if float_samples else None,
+        "spectral_similarity": round(float(np.mean([
+            similarity(reference, candidate)
+            for reference, candidate in zip(float_audio[:len(REPORT_SENTENCES)], quantized_audio)
+        ])), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Make int8 variants of the voice models.')
+    parser.add_argument('voices', nargs='*', choices=list(voices), default=list(voices), help='The voices to quantize')
+    parser.add_argument('--variant', default='int8', help='Name of the variant, the model is written as <voice>.<variant>.onnx')
+    parser.add_argument('--per-channel', action='store_true', help='Quantize weights per channel')
+    parser.add_argument('--report', action='store_true', help='Compare speed and output with the float models')
+    parser.add_argument('--repeats', type=int, default=4, help='Times the report sentences are synthesized')
+    args = parser.parse_args()
+
+    results = []
+    for voice_type in args.voices:
+        output_path = quantize(voice_type, args.variant, args.per_channel)
+        print(f"Wrote {output_path}")
+        if args.report:
+            results.append(report(voice_type, args.variant, args.repeats))
+
+    if results:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
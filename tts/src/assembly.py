@@ -0,0 +1,371 @@
+# src/assembly.py
+
+import logging
+import os
+import struct
+import wave
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn")
+
+WAV_HEADER_SIZE = 44
+SAMPLE_WIDTH = 2  # The assembled podcast is always 16-bit PCM
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    sample_rate: int
+    channels: int
+    sample_width: int
+
+
+def wav_header(sample_rate: int, channels: int, data_size: int) -> bytes:
+    """
+    Build a canonical 44 byte header for a 16-bit PCM .wav file.
+
+    :param sample_rate: The sample rate in Hz.
+    :param channels: The number of channels.
+    :param data_size: The size of the PCM data in bytes.
+    :return: The header as bytes.
+    """
+    block_align = channels * SAMPLE_WIDTH
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, sample_rate * block_align, block_align, SAMPLE_WIDTH * 8,
+        b'data', data_size,
+    )
+
+
+def open_wav(file: Union[BytesIO, bytes, str]) -> wave.Wave_read:
+    """
+    Open a .wav file given as BytesIO, bytes or a file path.
+
+    :param file: The .wav file.
+    :return: The opened wave reader.
+    """
+    if isinstance(file, bytes):
+        file = BytesIO(file)
+    if isinstance(file, BytesIO):
+        file.seek(0)  # Ensure the file pointer is at the beginning
+    return wave.open(file, 'rb')
+
+
+def read_wav(file: Union[BytesIO, bytes, str]) -> Tuple[AudioFormat, np.ndarray]:
+    """
+    Read a whole .wav file as 16-bit samples.
+
+    :param file: The .wav file as BytesIO, bytes or a file path.
+    :return: The format of the file and its samples with shape (frames, channels).
+    """
+    with open_wav(file) as wav:
+        audio_format = AudioFormat(wav.getframerate(), wav.getnchannels(), wav.getsampwidth())
+        frames = wav.readframes(wav.getnframes())
+    return audio_format, to_int16(frames, audio_format)
+
+
+def to_int16(frames: bytes, audio_format: AudioFormat) -> np.ndarray:
+    """
+    Convert raw PCM frames of any common sample width to 16-bit samples.
+
+    :param frames: The raw PCM frames.
+    :param audio_format: The format of the frames.
+    :return: The samples with shape (frames, channels).
+    """
+    width = audio_format.sample_width
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype='<i2')
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        samples = (raw[:, 1].astype(np.uint16) | (raw[:, 2].astype(np.uint16) << 8)).view(np.int16)
+    elif width == 4:
+        samples = (np.frombuffer(frames, dtype='<i4') >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"Unsupported sample width: {width}")
+    return samples.reshape(-1, audio_format.channels)
+
+
+def convert(samples: np.ndarray, sample_rate: int, target_rate: int, target_channels: int) -> np.ndarray:
+    """
+    Resample and remix 16-bit samples to another sample rate and channel count.
+
+    :param samples: The samples with shape (frames, channels).
+    :param sample_rate: The sample rate of the samples.
+    :param target_rate: The sample rate to convert to.
+    :param target_channels: The channel count to convert to.
+    :return: The converted samples with shape (frames, target_channels).
+    """
+    if samples.shape[1] != target_channels:
+        mono = samples.mean(axis=1, keepdims=True)
+        samples = np.repeat(mono, target_channels, axis=1)
+
+    if sample_rate != target_rate and len(samples):
+        num_frames = int(round(len(samples) * target_rate / sample_rate))
+        positions = np.arange(num_frames) * (sample_rate / target_rate)
+        source = np.arange(len(samples))
+        samples = np.stack([np.interp(positions, source, samples[:, c]) for c in range(target_channels)], axis=1)
+
+    return np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+
+
+def fade_out(samples: np.ndarray, sample_rate: int, duration_ms: int) -> np.ndarray:
+    """
+    Fade the end of the samples out linearly to silence.
+
+    :param samples: The samples with shape (frames, channels).
+    :param sample_rate: The sample rate of the samples.
+    :param duration_ms: The duration of the fade in milliseconds.
+    :return: The faded samples.
+    """
+    fade_frames = min(len(samples), int(sample_rate * duration_ms / 1000))
+    if fade_frames == 0:
+        return samples
+
+    samples = samples.copy()
+    ramp = np.linspace(1.0, 0.0, fade_frames, endpoint=False)[:, np.newaxis]
+    samples[-fade_frames:] = np.rint(samples[-fade_frames:] * ramp).astype(np.int16)
+    return samples
+
+
+class AudioTrack:
+    """Format, length and file offsets of an assembled podcast, as tracked while assembling it."""
+
+    def __init__(self, sample_rate: int, channels: int, num_frames: int = 0):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.num_frames = num_frames
+        # Frame where each concatenated file starts, None for files that could not be read
+        self.offsets: List[Optional[int]] = []
+        self.intro_frames = 0
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds."""
+        return self.num_frames / self.sample_rate
+
+    def metadata(self) -> Dict:
+        """Format and length of the audio, as tracked while assembling it."""
+        return {
+            'duration': self.duration,
+            'sample_rate': self.sample_rate,
+            'channels': self.channels,
+            'num_samples': self.num_frames,
+            'intro_duration': self.intro_frames / self.sample_rate,
+        }
+
+
+class AssembledAudio(AudioTrack):
+    """
+    A 16-bit PCM .wav file built in a single preallocated buffer.
+
+    The header and samples share the buffer, so the finished file never has to be copied or re-encoded.
+    """
+
+    def __init__(self, sample_rate: int, channels: int, num_frames: int):
+        super().__init__(sample_rate, channels, num_frames)
+        self.buffer = bytearray(WAV_HEADER_SIZE + num_frames * channels * SAMPLE_WIDTH)
+        self.buffer[:WAV_HEADER_SIZE] = wav_header(sample_rate, channels, num_frames * channels * SAMPLE_WIDTH)
+        self.samples = np.frombuffer(self.buffer, dtype='<i2', offset=WAV_HEADER_SIZE).reshape(-1, channels)
+
+    @property
+    def size(self) -> int:
+        """Size of the .wav file in bytes."""
+        return len(self.buffer)
+
+    def truncate(self, num_frames: int) -> None:
+        """
+        Shrink the file to its first frames, fixing up the header.
+
+        :param num_frames: The number of frames to keep.
+        """
+        # The buffer can not be resized while the samples view exports it
+        self.samples = None
+        del self.buffer[WAV_HEADER_SIZE + num_frames * self.channels * SAMPLE_WIDTH:]
+        self.buffer[:WAV_HEADER_SIZE] = wav_header(self.sample_rate, self.channels, num_frames * self.channels * SAMPLE_WIDTH)
+        self.samples = np.frombuffer(self.buffer, dtype='<i2', offset=WAV_HEADER_SIZE).reshape(-1, self.channels)
+        self.num_frames = num_frames
+
+    def to_bytes(self) -> bytes:
+        """The complete .wav file."""
+        return bytes(self.buffer)
+
+    def view(self) -> memoryview:
+        """The complete .wav file, without copying the buffer."""
+        return memoryview(self.buffer)
+
+
+class AssembledFile(AudioTrack):
+    """
+    A 16-bit PCM .wav file written to disk one piece at a time.
+
+    Only the piece being written is ever in memory. The header is written with a zero size first
+    and fixed up once every frame is in, so memory use does not depend on the length of the podcast.
+    """
+
+    def __init__(self, path: str, sample_rate: int, channels: int):
+        super().__init__(sample_rate, channels)
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(wav_header(sample_rate, channels, 0))
+
+    @property
+    def size(self) -> int:
+        """Size of the .wav file in bytes."""
+        return WAV_HEADER_SIZE + self.num_frames * self.channels * SAMPLE_WIDTH
+
+    def write(self, samples: np.ndarray) -> int:
+        """
+        Append samples to the file.
+
+        :param samples: 16-bit samples with shape (frames, channels).
+        :return: The frame where the samples start.
+        """
+        position = self.num_frames
+        self._file.write(samples.astype('<i2', copy=False).tobytes())
+        self.num_frames += len(samples)
+        return position
+
+    def close(self) -> None:
+        """Fix up the header with the final size and close the file."""
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(wav_header(self.sample_rate, self.channels, self.num_frames * self.channels * SAMPLE_WIDTH))
+        self._file.close()
+
+    def cleanup(self) -> None:
+        """Close and remove the file."""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def concatenate_wavs(files: List[Union[BytesIO, bytes, str]], intro: Optional[Tuple[int, np.ndarray]] = None) -> AssembledAudio:
+    """
+    Concatenate .wav files into one preallocated buffer, in linear time.
+
+    The output format is taken from the first file. Files in another format are converted to it,
+    which is only expected for the intro melody.
+
+    :param files: The .wav files as BytesIO, bytes or file paths, in order.
+    :param intro: An optional (sample rate, samples) intro to put before the files.
+    :return: The assembled audio.
+    """
+    # First pass: read the headers only, to check the format and size the buffer
+    formats = []
+    for index, file in enumerate(files):
+        try:
+            with open_wav(file) as wav:
+                formats.append((index, file, AudioFormat(wav.getframerate(), wav.getnchannels(), wav.getsampwidth()), wav.getnframes()))
+        except Exception as e:
+            logger.error(f"Error loading audio file: {e}")
+
+    if formats:
+        target = formats[0][2]
+    elif intro is not None:
+        target = AudioFormat(intro[0], intro[1].shape[1], SAMPLE_WIDTH)
+    else:
+        audio = AssembledAudio(22050, 1, 0)
+        audio.offsets = [None] * len(files)
+        return audio
+
+    intro_samples = None
+    if intro is not None:
+        intro_rate, intro_samples = intro
+        if intro_rate != target.sample_rate or intro_samples.shape[1] != target.channels:
+            intro_samples = convert(intro_samples, intro_rate, target.sample_rate, target.channels)
+
+    total_frames = len(intro_samples) if intro_samples is not None else 0
+    for _, _, audio_format, num_frames in formats:
+        if audio_format.sample_rate == target.sample_rate:
+            total_frames += num_frames
+        else:
+            total_frames += int(round(num_frames * target.sample_rate / audio_format.sample_rate))
+
+    audio = AssembledAudio(target.sample_rate, target.channels, total_frames)
+    audio.offsets = [None] * len(files)
+
+    # Second pass: copy every file's frames straight into its slot
+    position = 0
+    if intro_samples is not None:
+        audio.samples[:len(intro_samples)] = intro_samples
+        position = audio.intro_frames = len(intro_samples)
+
+    for index, file, audio_format, num_frames in formats:
+        try:
+            with open_wav(file) as wav:
+                samples = to_int16(wav.readframes(num_frames), audio_format)
+        except Exception as e:
+            logger.error(f"Error loading audio file: {e}")
+            continue
+        if audio_format.sample_rate != target.sample_rate or audio_format.channels != target.channels:
+            logger.warning(f"Audio file format {audio_format} differs from {target}, converting")
+            samples = convert(samples, audio_format.sample_rate, target.sample_rate, target.channels)
+        audio.samples[position:position + len(samples)] = samples
+        audio.offsets[index] = position
+        position += len(samples)
+
+    # Files that failed or came up short in this pass leave unused frames at the end, offsets follow what was written
+    if position < audio.num_frames:
+        audio.truncate(position)
+    return audio
+
+
+def concatenate_wavs_to_file(files: List[Union[BytesIO, bytes, str]], path: str,
+                             intro: Optional[Tuple[int, np.ndarray]] = None) -> AssembledFile:
+    """
+    Concatenate .wav files into a .wav file on disk, holding a single input file in memory at a time.
+
+    The output format is taken from the first readable file. Files in another format are converted to it,
+    which is only expected for the intro melody.
+
+    :param files: The .wav files as BytesIO, bytes or file paths, in order.
+    :param path: The path of the output file.
+    :param intro: An optional (sample rate, samples) intro to put before the files.
+    :return: The assembled file, closed and with its final header.
+    """
+    target = None
+    for file in files:
+        try:
+            with open_wav(file) as wav:
+                target = AudioFormat(wav.getframerate(), wav.getnchannels(), wav.getsampwidth())
+            break
+        except Exception as e:
+            logger.error(f"Error loading audio file: {e}")
+    if target is None:
+        target = AudioFormat(intro[0], intro[1].shape[1], SAMPLE_WIDTH) if intro is not None else AudioFormat(22050, 1, SAMPLE_WIDTH)
+
+    audio = AssembledFile(path, target.sample_rate, target.channels)
+    audio.offsets = [None] * len(files)
+    try:
+        if intro is not None:
+            intro_rate, intro_samples = intro
+            if intro_rate != target.sample_rate or intro_samples.shape[1] != target.channels:
+                intro_samples = convert(intro_samples, intro_rate, target.sample_rate, target.channels)
+            audio.write(intro_samples)
+            audio.intro_frames = len(intro_samples)
+
+        for index, file in enumerate(files):
+            try:
+                audio_format, samples = read_wav(file)
+            except Exception as e:
+                logger.error(f"Error loading audio file: {e}")
+                continue
+            if audio_format.sample_rate != target.sample_rate or audio_format.channels != target.channels:
+                logger.warning(f"Audio file format {audio_format} differs from {target}, converting")
+                samples = convert(samples, audio_format.sample_rate, target.sample_rate, target.channels)
+            audio.offsets[index] = audio.write(samples)
+
+        audio.close()
+    except Exception:
+        audio.cleanup()
+        raise
+    return audio
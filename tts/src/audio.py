@@ -1,35 +1,52 @@
 import json
 import time
 import os
-import piper
-import wave
-from pydub import AudioSegment
-from typing import List, Dict
+import tempfile
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 import logging
 from io import BytesIO
-import random
-
+import heapq
+import re
+from concurrent.futures import Future
+
+from src.assembly import AssembledAudio, AssembledFile, AudioTrack, concatenate_wavs, concatenate_wavs_to_file
+from src.checkpoint import CHECKPOINT_DIR, CHECKPOINT_ENABLED, SynthesisManifest, script_digest
+from src.encoding import OUTPUT_FORMATS, encode_audio, encode_audio_file
+from src.intros import intro_bank
 from src.models import Podcast
-from src.storage import FirebaseStorage
+from src.progress import PodcastProgress
+from src.spool import AudioSpool, SPOOL_DIR
+from src.synthesis import synthesis_engine
 
 logger = logging.getLogger("uvicorn")
-firebase_storage = FirebaseStorage()
-
-voices_folder = 'voices/'
-"""
-voices = {
-    "male": (voices_folder + "en_US-libritts-high.onnx", voices_folder + "en_US-libritts-high.onnx.json"),
-    "female": (voices_folder + "en_GB-northern_english_male-medium.onnx", voices_folder + "en_GB-northern_english_male-medium.onnx.json")
-}
-"""
-voices = {
-    "male": (voices_folder + "male.onnx", voices_folder + "male.json"),
-    "female": (voices_folder + "female.onnx", voices_folder + "female.json")
-}
+
+# Where scripts and podcasts are stored: "firebase", or "local" (a directory, for benchmarks and offline runs)
+STORAGE_BACKEND = os.getenv('TTS_STORAGE_BACKEND', 'firebase')
+LOCAL_STORAGE_DIR = os.getenv('TTS_LOCAL_STORAGE_DIR', os.path.join(tempfile.gettempdir(), 'podai-storage'))
+
+
+def create_storage():
+    """Create the storage backend, Firebase is only imported when it is used."""
+    if STORAGE_BACKEND == 'local':
+        from src.local_storage import LocalStorage
+        return LocalStorage(LOCAL_STORAGE_DIR)
+    from src.storage import FirebaseStorage
+    return FirebaseStorage()
+
+
+firebase_storage = create_storage()
+
+# Where synthesized sentences wait for assembly: "memory" or "spool" (local directory)
+AUDIO_STORE = os.getenv('TTS_AUDIO_STORE', 'memory')
+# Also upload every sentence to Firebase Storage as a checkpoint while synthesizing
+CHECKPOINT_TEMP = os.getenv('TTS_CHECKPOINT_TEMP', 'false').lower() == 'true'
+# How the podcast is assembled: "memory" (one preallocated buffer) or "file" (streamed to disk, flat memory use)
+ASSEMBLY_MODE = os.getenv('TTS_ASSEMBLY_MODE', 'memory')
+ASSEMBLY_DIR = os.getenv('TTS_ASSEMBLY_DIR', tempfile.gettempdir())
 
 def get_audio_files(user_id: str, podcast_id: str) -> List[BytesIO]:
     """
-    Get a list of .wav files from Firebase Storage.
+    Get a list of .wav files from Firebase Storage, downloaded concurrently.
 
     :param user_id: The user ID.
     :param podcast_id: The podcast ID.
@@ -45,13 +62,12 @@ def get_audio_files(user_id: str, podcast_id: str) -> List[BytesIO]:
         logger.info(f"Found {len(files)} .wav files for podcast {podcast_id}")
         
         audio_files = []
+        downloaded = firebase_storage.get_temp_audio_files(user_id, podcast_id, files)
         for file in files:
-            logger.debug(f"Attempting to load audio file: {file}")
-            audio_file = firebase_storage.get_temp_audio_file(user_id, podcast_id, file)
-            if audio_file is None:
+            if downloaded[file] is None:
                 logger.error(f"Error loading audio file: {file}")
             else:
-                audio_files.append(audio_file)
+                audio_files.append(downloaded[file])
         
         return audio_files
     
@@ -60,65 +76,118 @@ def get_audio_files(user_id: str, podcast_id: str) -> List[BytesIO]:
         return []
 
 
-def concatenate_audio_files(files: List[BytesIO]) -> AudioSegment:
+def concatenate_audio_files(files: List[Union[BytesIO, bytes, str]], podcast_id: Optional[str] = None) -> AudioTrack:
     """
-    Concatenate audio files into a single AudioSegment, starting with a random intro melody.
+    Concatenate audio files into a single .wav file, starting with a random intro melody.
+
+    In "file" assembly mode the .wav file is written to ASSEMBLY_DIR instead of memory.
 
-    :param files: The list of BytesIO objects to concatenate.
-    :return: The concatenated AudioSegment.
+    :param files: The list of BytesIO objects, bytes or .wav file paths to concatenate.
+    :param podcast_id: The podcast ID, names the assembled file.
+    :return: The concatenated audio.
     """
-    audio_files = []
+    if ASSEMBLY_MODE == 'file':
+        path = os.path.join(ASSEMBLY_DIR, f"{podcast_id or 'podcast'}.{os.getpid()}.wav")
+        return concatenate_wavs_to_file(files, path, intro=intro_bank.choice())
+    return concatenate_wavs(files, intro=intro_bank.choice())
 
-    # Select a random intro melody from the 'audios' folder
-    intro_folder = 'audios'
-    intro_files = [f for f in os.listdir(intro_folder) if f.endswith('.wav')]
-    if intro_files:
-        intro_file_path = os.path.join(intro_folder, random.choice(intro_files))
-        try:
-            logger.debug(f"Loading intro melody from {intro_file_path}")
-            intro_audio = AudioSegment.from_wav(intro_file_path)
-            intro_audio = intro_audio.fade_out(duration=2000)  # Fade out in the last 2 seconds
-            audio_files.append(intro_audio)
-            logger.info(f"Successfully loaded intro melody")
-        except Exception as e:
-            logger.error(f"Error loading intro melody: {e}")
+def section_offsets(audio: AudioTrack, lines: List[int], sections: Dict[str, int]) -> List[Dict]:
+    """
+    Find where each section starts in the concatenated audio.
 
-    for file in files:
-        try:
-            if isinstance(file, bytes):
-                file = BytesIO(file)
-            elif not isinstance(file, BytesIO):
-                logger.error(f"Invalid file type: {type(file)}. Expected BytesIO or bytes.")
-                continue
-            
-            logger.debug(f"Loading audio file")
-            file.seek(0)  # Ensure the file pointer is at the beginning
-            audio = AudioSegment.from_wav(file)
-            audio_files.append(audio)
-            logger.info(f"Successfully loaded audio file")
-            
-        except Exception as e:
-            logger.error(f"Error loading audio file: {e}")
-            continue
+    :param audio: The concatenated audio.
+    :param lines: The line number of each concatenated file, in order.
+    :param sections: A dictionary where keys are section names and values are the first line of the section.
+    :return: A list of sections with their title and start time in seconds.
+    """
+    line_offsets = {line: offset for line, offset in zip(lines, audio.offsets) if offset is not None}
+    starts = sorted(sections.items(), key=lambda section: section[1])
+
+    offsets = []
+    for i, (section_name, first_line) in enumerate(starts):
+        next_line = starts[i + 1][1] if i + 1 < len(starts) else float('inf')
+        section_lines = [line for line in line_offsets if first_line <= line < next_line]
+        if section_lines:
+            offsets.append({
+                'title': re.sub(r'^\d+_', '', section_name),
+                'offset': line_offsets[min(section_lines)] / audio.sample_rate,
+            })
+    return offsets
+
+def export_rendition(audio: AssembledAudio, user_id: str, podcast_id: str, codec: str) -> int:
+    """
+    Encode audio assembled in memory and upload it.
+
+    :return: The size of the uploaded file in bytes.
+    """
+    audio_data = encode_audio(audio.view(), codec)
+    firebase_storage.save_audio(user_id, podcast_id, audio_data, codec)
+    return len(audio_data)
 
-    return sum(audio_files, AudioSegment.empty())
+def export_rendition_file(audio: AssembledFile, user_id: str, podcast_id: str, codec: str) -> int:
+    """
+    Encode audio assembled to a file into another file and upload it with a resumable upload.
 
-def export_audio(audio: AudioSegment, user_id: str, podcast_id: str) -> None:
+    :return: The size of the uploaded file in bytes.
+    """
+    if codec == 'wav':
+        firebase_storage.save_audio_file(user_id, podcast_id, audio.path, codec)
+        return audio.size
+
+    output_path = f"{os.path.splitext(audio.path)[0]}.{codec}"
+    try:
+        encode_audio_file(audio.path, codec, output_path)
+        firebase_storage.save_audio_file(user_id, podcast_id, output_path, codec)
+        return os.path.getsize(output_path)
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+def export_audio(audio: AudioTrack, user_id: str, podcast_id: str, metadata: Optional[Dict] = None) -> bool:
     """
-    Export an AudioSegment to Firebase Storage.
+    Encode the concatenated audio in every output format and export it to Firebase Storage.
 
-    :param audio: The AudioSegment to export.
+    The audio metadata is known from assembly, the exported files are never decoded again.
+    Audio assembled to a file is encoded and uploaded from disk, without loading it in memory.
+
+    :param audio: The concatenated audio.
     :param user_id: The user ID.
     :param podcast_id: The podcast ID.
+    :param metadata: Extra metadata to store with the podcast, such as section offsets.
+    :return: True if the podcast was uploaded and marked as ready.
     """
     try:
         logger.debug(f"Exporting audio for podcast {podcast_id}")
-        buffer = BytesIO()
-        audio.export(buffer, format='wav')
-        firebase_storage.save_audio(user_id, podcast_id, buffer.getvalue())
+        export = export_rendition_file if isinstance(audio, AssembledFile) else export_rendition
+
+        codecs = []
+        sizes = {}
+        for codec in OUTPUT_FORMATS:
+            try:
+                sizes[codec] = export(audio, user_id, podcast_id, codec)
+                codecs.append(codec)
+                logger.info(f"Successfully exported {codec} audio for podcast {podcast_id}")
+            except Exception as e:
+                logger.error(f"Error exporting {codec} audio: {e}")
+
+        # Never leave a podcast without audio because an encoder is missing
+        if not codecs:
+            sizes['wav'] = export(audio, user_id, podcast_id, 'wav')
+            codecs.append('wav')
+
+        firebase_storage.set_ready(user_id, podcast_id, {
+            **audio.metadata(),
+            **(metadata or {}),
+            'codec': codecs[0],
+            'codecs': codecs,
+            'size': sizes[codecs[0]],
+            'sizes': sizes,
+        })
         logger.info(f"Successfully exported audio for podcast {podcast_id}")
+        return True
     except Exception as e:
         logger.error(f"Error exporting audio: {e}")
+        return False
 
 def remove_temp_files(user_id: str, podcast_id: str) -> None:
     """
@@ -134,69 +203,223 @@ def remove_temp_files(user_id: str, podcast_id: str) -> None:
     except Exception as e:
         logger.error(f"Error removing temporary files: {e}")
 
-def concatenate_audio(user_id: str, podcast_id: str) -> None:
+def concatenate_audio(user_id: str, podcast_id: str, files: Optional[List[Union[BytesIO, bytes, str]]] = None,
+                      lines: Optional[List[int]] = None, sections: Optional[Dict[str, int]] = None) -> bool:
     """
-    Concatenate .wav files in Firebase Storage into a single .wav file, then remove the original files.
+    Concatenate .wav files into a single .wav file and upload it.
+
+    When no files are given, the checkpointed .wav files in Firebase Storage are used instead.
+    Checkpointed files are removed once the podcast is uploaded.
 
     :param user_id: The user ID.
     :param podcast_id: The podcast ID.
+    :param files: The list of synthesized .wav files in line order.
+    :param lines: The line number of each file, used to find where sections start.
+    :param sections: A dictionary where keys are section names and values are the first line of the section.
+    :return: True if the podcast was uploaded.
     """
     try:
-        logger.debug("Getting audio files")
-        files = get_audio_files(user_id, podcast_id)
-        logger.info(f"Got {len(files)} audio files")
+        if files is None:
+            logger.debug("Getting audio files")
+            files = get_audio_files(user_id, podcast_id)
+            logger.info(f"Got {len(files)} audio files")
 
         logger.debug("Concatenating audio files")
-        combined = concatenate_audio_files(files)
+        combined = concatenate_audio_files(files, podcast_id)
         logger.info("Successfully concatenated audio files")
 
-        logger.debug(f"Exporting audio for podcast {podcast_id}")
-        export_audio(combined, user_id, podcast_id)
-        logger.info(f"Successfully exported audio for podcast {podcast_id}")
-
-        logger.debug("Removing temporary audio files")
-        remove_temp_files(user_id, podcast_id)
-        logger.info("Successfully removed temporary audio files")
+        try:
+            metadata = {}
+            if lines is not None and sections:
+                metadata['sections'] = section_offsets(combined, lines, sections)
+
+            logger.debug(f"Exporting audio for podcast {podcast_id}")
+            if not export_audio(combined, user_id, podcast_id, metadata):
+                return False
+            logger.info(f"Successfully exported audio for podcast {podcast_id}")
+        finally:
+            if isinstance(combined, AssembledFile):
+                combined.cleanup()
+
+        if CHECKPOINT_TEMP:
+            logger.debug("Removing temporary audio files")
+            remove_temp_files(user_id, podcast_id)
+            logger.info("Successfully removed temporary audio files")
+        return True
 
     except Exception as e:
         logger.error(f"Error in audio processing: {e}")
+        return False
+
+def merge_hosts(male_host: Dict[int, str], female_host: Dict[int, str]) -> Dict[int, Tuple[str, str]]:
+    """
+    Merge the sentences of both hosts back into a single script in line order.
+
+    :param male_host: A dictionary where keys are sentence IDs and values are sentences spoken by the male host.
+    :param female_host: A dictionary where keys are sentence IDs and values are sentences spoken by the female host.
+    :return: A dictionary where keys are sentence IDs and values are (voice type, sentence) tuples.
+    """
+    lines = {sentence_id: ("male", sentence) for sentence_id, sentence in male_host.items()}
+    lines.update({sentence_id: ("female", sentence) for sentence_id, sentence in female_host.items()})
+    return dict(sorted(lines.items()))
 
-def generate_audio_for_host(host_sentences: Dict[str, str], voice_type: str, user_id: str, podcast_id: str) -> None:
+def save_temp_audio_line(sentence_id: int, wav_data: bytes, user_id: str, podcast_id: str) -> Optional[Future]:
     """
-    Generate audio files for each sentence spoken by a host and save to Firebase Storage.
+    Checkpoint a synthesized sentence to Firebase Storage in the background.
 
-    :param host_sentences: A dictionary where keys are sentence IDs and values are sentences.
-    :param voice_type: The type of voice to use ("male" or "female").
+    :param sentence_id: The sentence ID.
+    :param wav_data: The .wav file as bytes.
     :param user_id: The user ID.
     :param podcast_id: The podcast ID.
+    :return: The future of the upload, or None if it could not be started.
     """
-    for sentence_id, sentence in host_sentences.items():
-        voice = piper.PiperVoice.load(voices[voice_type][0], voices[voice_type][1], True)
-        buffer = BytesIO()
-        with wave.open(buffer, 'wb') as wav:
-            try:
-                logger.debug(f"Synthesizing audio for sentence {sentence_id}")
-                voice.synthesize(sentence, wav)
-                # if number is only less than 4 digits, add the corresponding ammount of 0 to the front
-                if sentence_id < 1000:
-                    sentence_id = f"{sentence_id:04}"
-                logger.info(f"Successfully synthesized audio for sentence {sentence_id}")
-                firebase_storage.save_temp_audio_file(user_id, podcast_id, f"{sentence_id}.wav", buffer.getvalue())
-            except Exception as e:
-                logger.error(f"Error in generating audio for sentence {sentence_id}: {e}. Skipping to next sentence.")
+    # if number is only less than 4 digits, add the corresponding ammount of 0 to the front
+    if sentence_id < 1000:
+        sentence_id = f"{sentence_id:04}"
+    try:
+        return firebase_storage.save_temp_audio_file_async(user_id, podcast_id, f"{sentence_id}.wav", wav_data)
+    except Exception as e:
+        logger.error(f"Error saving audio for sentence {sentence_id}: {e}. Skipping to next sentence.")
+        return None
 
-def generate_audio(male_host: Dict[str, str], female_host: Dict[str, str], user_id: str, podcast_id: str) -> None:
+def wait_for_uploads(uploads: List[Future]) -> None:
+    """
+    Wait for background checkpoint uploads, logging the ones that failed.
+
+    :param uploads: The futures of the uploads.
+    """
+    failed = 0
+    for upload in uploads:
+        try:
+            upload.result()
+        except Exception as e:
+            failed += 1
+            logger.error(f"Error saving audio checkpoint: {e}")
+    if failed:
+        logger.warning(f"{failed} of {len(uploads)} checkpoint uploads failed")
+
+def restore_checkpoint(manifest: SynthesisManifest, spool: AudioSpool, user_id: str, podcast_id: str) -> List[int]:
+    """
+    Put the lines synthesized by a previous attempt back into the spool.
+
+    Lines whose local file survived are used as is, the others are downloaded from the Firebase Storage
+    checkpoint when it is enabled and was made for the same script.
+
+    :param manifest: The manifest of the podcast.
+    :param spool: The spool of the podcast.
+    :param user_id: The user ID.
+    :param podcast_id: The podcast ID.
+    :return: The restored line numbers.
+    """
+    for line, file_path in manifest.local_lines().items():
+        spool.restore(line, file_path)
+
+    if CHECKPOINT_TEMP:
+        remote_manifest = firebase_storage.get_temp_manifest(user_id, podcast_id)
+        if remote_manifest is None or remote_manifest.get("digest") != manifest.digest:
+            if remote_manifest is not None:
+                firebase_storage.remove_temp_audio_files(user_id, podcast_id)
+            firebase_storage.save_temp_manifest(user_id, podcast_id, {"digest": manifest.digest})
+        else:
+            # Checkpointed lines of an attempt whose local files are gone, e.g. on another instance
+            for file in firebase_storage.list_temp_audio_files(user_id, podcast_id):
+                file_name = file.split('/')[-1]
+                if file_name.endswith('.wav') and file_name[:-4].isdigit() and int(file_name[:-4]) not in spool:
+                    manifest.record(int(file_name[:-4]), remote=True)
+
+        remote_lines = manifest.remote_lines(exclude=spool.lines())
+        if remote_lines:
+            file_names = [f"{line:04}.wav" for line in remote_lines]
+            downloaded = firebase_storage.get_temp_audio_files(user_id, podcast_id, file_names)
+            for line, file_name in zip(remote_lines, file_names):
+                if downloaded[file_name] is not None:
+                    spool.add(line, downloaded[file_name])
+                    manifest.record(line, spool.get(line), remote=True)
+
+    return spool.lines()
+
+def _record_upload(manifest: SynthesisManifest, line: int):
+    def record(upload: Future) -> None:
+        if upload.exception() is None:
+            manifest.record(line, remote=True)
+    return record
+
+def _restored_iter(spool: AudioSpool, restored: List[int]) -> Iterator[Tuple[int, bytes]]:
+    for line in restored:
+        wav_data = spool.get(line)
+        if isinstance(wav_data, str):
+            with open(wav_data, 'rb') as file:
+                wav_data = file.read()
+        yield line, wav_data
+
+def generate_audio(male_host: Dict[str, str], female_host: Dict[str, str], user_id: str, podcast_id: str,
+                   sections: Optional[Dict[str, int]] = None, progress: Optional[PodcastProgress] = None) -> bool:
     """
     Generate audio files for each sentence spoken by the male and female hosts, then concatenate the audio files.
 
+    Sentences do not depend on each other, so both hosts are synthesized together across the synthesis pool.
+    They are kept in memory or in the local spool until assembly, only the final podcast is uploaded.
+    With checkpoints enabled, sentences are spooled next to a manifest that survives a failed attempt,
+    so a retry of the same script only synthesizes the missing lines.
+
     :param male_host: A dictionary where keys are sentence IDs and values are sentences spoken by the male host.
     :param female_host: A dictionary where keys are sentence IDs and values are sentences spoken by the female host.
     :param user_id: The user ID.
     :param podcast_id: The podcast ID.
+    :param sections: A dictionary where keys are section names and values are the first line of the section.
+    :param progress: Optional progress tracker updated as sentences are synthesized.
+    :return: True if the podcast was uploaded.
     """
-    generate_audio_for_host(male_host, "male", user_id, podcast_id)
-    generate_audio_for_host(female_host, "female", user_id, podcast_id)
-    concatenate_audio(user_id, podcast_id)
+    lines = merge_hosts(male_host, female_host)
+    progress = progress or PodcastProgress()
+    uploads = []
+    completed = False
+
+    manifest = None
+    if CHECKPOINT_ENABLED:
+        manifest = SynthesisManifest.open(podcast_id, script_digest(lines))
+        spool = AudioSpool(podcast_id, CHECKPOINT_DIR)
+    else:
+        spool = AudioSpool(podcast_id, SPOOL_DIR if AUDIO_STORE == 'spool' else None)
+
+    try:
+        restored = restore_checkpoint(manifest, spool, user_id, podcast_id) if manifest else []
+        missing = {line: lines[line] for line in lines if line not in spool}
+        logger.debug(f"Synthesizing {len(missing)} sentences, {len(restored)} restored from checkpoint")
+
+        progress.attach(spool)
+        progress.start(len(lines))
+        restored_lines = set(restored)
+        synthesized = synthesis_engine.synthesize_iter(missing, podcast_id, user_id)
+        for sentence_id, wav_data in heapq.merge(_restored_iter(spool, restored), synthesized, key=lambda item: item[0]):
+            if sentence_id in restored_lines:
+                progress.advance(sentence_id)
+                continue
+
+            spool.add(sentence_id, wav_data)
+            progress.advance(sentence_id)
+            if manifest:
+                manifest.record(sentence_id, spool.get(sentence_id))
+            if CHECKPOINT_TEMP:
+                upload = save_temp_audio_line(sentence_id, wav_data, user_id, podcast_id)
+                if upload is not None:
+                    if manifest:
+                        upload.add_done_callback(_record_upload(manifest, sentence_id))
+                    uploads.append(upload)
+        progress.finish()
+        wait_for_uploads(uploads)
+        logger.info(f"Successfully synthesized {len(spool)} of {len(lines)} sentences")
+
+        progress.set_stage("assembling")
+        completed = concatenate_audio(user_id, podcast_id, spool.files(), spool.lines(), sections)
+    finally:
+        progress.finish()
+        if manifest is None or completed:
+            # Streaming listeners may still be reading the spool
+            progress.release(spool.cleanup)
+        else:
+            logger.info(f"Keeping {len(spool)} checkpointed sentences of podcast {podcast_id} for a retry")
+    return completed
 
 def split_script_by_host(script: Dict[str, str]) -> Dict[str, Dict[str, str]]:
     """
@@ -204,12 +427,15 @@ def split_script_by_host(script: Dict[str, str]) -> Dict[str, Dict[str, str]]:
 
     :param script: A dictionary where keys are sentence IDs and values are sentences.
     :return: A dictionary where keys are "male" and "female" and values are dictionaries where keys are sentence IDs and values are sentences.
+             The "sections" key maps every section name to the first line of the section.
     """
     male_host = {}
     female_host = {}
+    sections = {}
     line = 0
 
     for section_name in script.keys():   
+        sections[section_name] = line + 1
         for i in script[section_name]:
             line += 1
             try:
@@ -224,13 +450,15 @@ def split_script_by_host(script: Dict[str, str]) -> Dict[str, Dict[str, str]]:
                 logger.error(f"Error processing line {line}: {e}")
                 continue
 
-    return {"male": male_host, "female": female_host}
+    return {"male": male_host, "female": female_host, "sections": sections}
 
-def generate_podcast(podcast: Podcast) -> None:
+def generate_podcast(podcast: Podcast, progress: Optional[PodcastProgress] = None) -> bool:
     """
     Generate a podcast from a script.
 
     :param podcast: The Podcast object containing podcast information.
+    :param progress: Optional progress tracker updated while the podcast is generated.
+    :return: True if the podcast was generated and uploaded.
     """
     try:
         start_time = time.time()
@@ -239,7 +467,7 @@ def generate_podcast(podcast: Podcast) -> None:
         script = firebase_storage.get_script(podcast.user_id, podcast.podcast_id)
         if script is None:
             logger.error(f"Script not found: {podcast.podcast_id}")
-            return
+            return False
         
         # order the script by section names
         script = {k: script[k] for k in sorted(script.keys())}
@@ -256,10 +484,13 @@ def generate_podcast(podcast: Podcast) -> None:
 
         # Generate audio
         logger.debug("Generating audio")
-        generate_audio(hosts["male"], hosts["female"], podcast.user_id, podcast.podcast_id)
+        if not generate_audio(hosts["male"], hosts["female"], podcast.user_id, podcast.podcast_id, hosts["sections"], progress):
+            return False
         logger.info("Successfully generated audio")
 
         end_time = time.time()
         logger.info(f"Podcast generated in {end_time - start_time:.2f} seconds.")
+        return True
     except Exception as e:
-        logger.error(f"Error in generating podcast: {e}")
\ No newline at end of file
+        logger.error(f"Error in generating podcast: {e}")
+        return False
\ No newline at end of file
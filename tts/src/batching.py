@@ -0,0 +1,122 @@
+# src/batching.py
+
+import os
+import wave
+from io import BytesIO
+from typing import List, Tuple
+
+import numpy as np
+import piper
+from piper.util import audio_float_to_int16
+
+# Sentences per onnxruntime call, 1 keeps the one sentence per call path
+BATCH_SIZE = int(os.getenv('TTS_BATCH_SIZE', '1'))
+# "sorted" groups sentences of similar length to minimize padding, "fifo" keeps script order
+BATCH_PADDING = os.getenv('TTS_BATCH_PADDING', 'sorted')
+
+# Padded items come out of the model with a near-silent tail, trimmed back below this amplitude
+PADDING_SILENCE_THRESHOLD = 1e-3
+PADDING_TAIL_SECONDS = 0.05
+
+
+def phonemize_sentences(voice: piper.PiperVoice, sentences: List[str]) -> List[Tuple[int, List[int]]]:
+    """
+    Turn sentences into phoneme id sequences, Piper splits each one further into spoken sentences.
+
+    :param voice: The voice to phonemize with.
+    :param sentences: The sentences.
+    :return: A list of (sentence index, phoneme ids) tuples in order.
+    """
+    units = []
+    for index, sentence in enumerate(sentences):
+        for phonemes in voice.phonemize(sentence):
+            units.append((index, voice.phonemes_to_ids(phonemes)))
+    return units
+
+
+def trim_padding(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """
+    Cut the near-silent tail a padded item gets from the batch.
+
+    :param audio: The float audio of one item.
+    :param sample_rate: The sample rate of the voice.
+    :return: The trimmed audio.
+    """
+    loud = np.flatnonzero(np.abs(audio) > PADDING_SILENCE_THRESHOLD)
+    if not len(loud):
+        return audio[:0]
+    end = min(len(audio), loud[-1] + 1 + int(PADDING_TAIL_SECONDS * sample_rate))
+    return audio[:end]
+
+
+def run_batch(voice: piper.PiperVoice, id_lists: List[List[int]]) -> List[np.ndarray]:
+    """
+    Synthesize several phoneme id sequences in a single onnxruntime call.
+
+    :param voice: The voice to synthesize with.
+    :param id_lists: The phoneme id sequences.
+    :return: The 16-bit audio of each sequence.
+    """
+    config = voice.config
+    lengths = np.array([len(ids) for ids in id_lists], dtype=np.int64)
+    pad_id = config.phoneme_id_map.get("_", [0])[0]
+    phoneme_ids = np.full((len(id_lists), lengths.max()), pad_id, dtype=np.int64)
+    for row, ids in enumerate(id_lists):
+        phoneme_ids[row, :len(ids)] = ids
+
+    inputs = {
+        "input": phoneme_ids,
+        "input_lengths": lengths,
+        "scales": np.array([config.noise_scale, config.length_scale, config.noise_w], dtype=np.float32),
+    }
+    if config.num_speakers > 1:
+        inputs["sid"] = np.zeros(len(id_lists), dtype=np.int64)
+
+    audio = voice.session.run(None, inputs)[0].reshape(len(id_lists), -1)
+
+    results = []
+    for row, length in enumerate(lengths):
+        item = audio[row]
+        if length < lengths.max():
+            item = trim_padding(item, config.sample_rate)
+        results.append(audio_float_to_int16(item) if len(item) else np.zeros(0, dtype=np.int16))
+    return results
+
+
+def synthesize_batch(voice: piper.PiperVoice, sentences: List[str], batch_size: int = BATCH_SIZE,
+                     padding: str = BATCH_PADDING) -> List[bytes]:
+    """
+    Synthesize sentences of one voice in padded batches.
+
+    :param voice: The voice to synthesize with.
+    :param sentences: The sentences.
+    :param batch_size: The number of phoneme sequences per onnxruntime call.
+    :param padding: "sorted" to batch sequences of similar length together, "fifo" to batch them in order.
+    :return: The .wav file of each sentence, in order.
+    """
+    units = phonemize_sentences(voice, sentences)
+    order = list(range(len(units)))
+    if padding == "sorted":
+        order.sort(key=lambda unit: len(units[unit][1]))
+
+    audio = [None] * len(units)
+    for start in range(0, len(order), max(1, batch_size)):
+        batch = order[start:start + batch_size]
+        for unit, samples in zip(batch, run_batch(voice, [units[unit][1] for unit in batch])):
+            audio[unit] = samples
+
+    pieces: List[List[np.ndarray]] = [[] for _ in sentences]
+    for (index, _), samples in zip(units, audio):
+        pieces[index].append(samples)
+
+    wav_files = []
+    for sentence_pieces in pieces:
+        buffer = BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setframerate(voice.config.sample_rate)
+            wav.setsampwidth(2)
+            wav.setnchannels(1)
+            for samples in sentence_pieces:
+                wav.writeframes(samples.tobytes())
+        wav_files.append(buffer.getvalue())
+    return wav_files
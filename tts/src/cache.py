@@ -0,0 +1,202 @@
+# src/cache.py
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("uvicorn")
+
+CACHE_ENABLED = os.getenv('TTS_CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'podai-cache'))
+CACHE_MAX_MB = int(os.getenv('TTS_CACHE_MAX_MB', '1024'))
+
+AUDIO_CACHE_ENABLED = os.getenv('TTS_AUDIO_CACHE_ENABLED', 'true').lower() == 'true'
+AUDIO_CACHE_DIR = os.getenv('TTS_AUDIO_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'podai-audio-cache'))
+AUDIO_CACHE_MAX_MB = int(os.getenv('TTS_AUDIO_CACHE_MAX_MB', '2048'))
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so that formatting-only changes still hit the cache."""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class DiskCache:
+    """
+    Size-bounded, least-recently-used cache of files in a local directory.
+
+    The LRU order survives restarts through the files' modification times.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, suffix: str = ''):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU order from the files left by previous runs, oldest access first."""
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith('.tmp') or not file_name.endswith(self.suffix):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, file_name))
+            entries.append((stat.st_mtime, file_name[:len(file_name) - len(self.suffix)], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+        logger.info(f"Cache {self.cache_dir} has {len(self._entries)} entries ({self._size / (1024 * 1024):.1f} MB)")
+
+    def get_path(self, key: str) -> Optional[str]:
+        """
+        Look up a cached file.
+
+        :param key: The cache key.
+        :return: The path of the cached file, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            os.utime(self.path(key))  # Keep the LRU order across restarts
+        except OSError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return self.path(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read a cached file.
+
+        :param key: The cache key.
+        :return: The content of the file, or None on a miss.
+        """
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def put_file(self, key: str, write: Callable[[str], None]) -> Optional[str]:
+        """
+        Store a file, evicting the least recently used ones if the cache is full.
+
+        :param key: The cache key.
+        :param write: A function writing the content to the path it is given.
+        :return: The path of the cached file, or None if it could not be stored.
+        """
+        # Write to a temporary file first so readers never see a partial entry
+        temp_path = f"{self.path(key)}.{threading.get_ident()}.tmp"
+        try:
+            write(temp_path)
+            size = os.path.getsize(temp_path)
+            if size > self.max_bytes:
+                os.remove(temp_path)
+                return None
+            os.replace(temp_path, self.path(key))
+        except OSError as e:
+            logger.error(f"Error writing cache entry {key}: {e}")
+            return None
+
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+        return self.path(key)
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Store content, evicting the least recently used entries if the cache is full.
+
+        :param key: The cache key.
+        :param data: The content to store.
+        """
+        if len(data) > self.max_bytes:
+            return
+
+        def write(path: str) -> None:
+            with open(path, 'wb') as file:
+                file.write(data)
+
+        self.put_file(key, write)
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._size / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class SentenceCache(DiskCache):
+    """
+    Disk cache of synthesized sentences.
+
+    Entries are content addressed: the key is a hash of the voice, its synthesis settings and the
+    normalized sentence text, so a regenerated podcast only synthesizes the lines that changed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        super().__init__(cache_dir, max_bytes, suffix='.wav')
+
+    @staticmethod
+    def key(voice_fingerprint: str, text: str) -> str:
+        """
+        Build the cache key of a sentence.
+
+        :param voice_fingerprint: A digest of the voice model and its synthesis settings.
+        :param text: The sentence text.
+        :return: The cache key.
+        """
+        return hashlib.sha256(f"{voice_fingerprint}\n{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+
+sentence_cache = SentenceCache(CACHE_DIR, CACHE_MAX_MB * 1024 * 1024) if CACHE_ENABLED else None
+# Finished podcasts, keyed by podcast id, codec and storage generation so regenerated podcasts miss
+audio_cache = DiskCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB * 1024 * 1024) if AUDIO_CACHE_ENABLED else None
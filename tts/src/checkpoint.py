@@ -0,0 +1,158 @@
+# src/checkpoint.py
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("uvicorn")
+
+# Keep synthesized sentences of failed jobs so a retry only synthesizes the missing lines
+CHECKPOINT_ENABLED = os.getenv('TTS_CHECKPOINT_ENABLED', 'true').lower() == 'true'
+CHECKPOINT_DIR = os.getenv('TTS_CHECKPOINT_DIR', os.path.join(tempfile.gettempdir(), 'podai-checkpoints'))
+CHECKPOINT_TTL = int(os.getenv('TTS_CHECKPOINT_TTL', '86400'))  # Seconds a failed job's checkpoint is kept
+
+MANIFEST_FILE = 'manifest.jsonl'
+
+
+def script_digest(lines: Dict[int, Tuple[str, str]]) -> str:
+    """
+    Digest of a script, a checkpoint is only resumed for the exact script it was made for.
+
+    :param lines: A dictionary where keys are line numbers and values are (voice type, sentence) tuples.
+    :return: The hex digest.
+    """
+    content = json.dumps(sorted(lines.items()), ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def prune_checkpoints(checkpoint_dir: str = CHECKPOINT_DIR, ttl: int = CHECKPOINT_TTL) -> None:
+    """Remove checkpoints that were not touched for longer than the TTL."""
+    if not os.path.isdir(checkpoint_dir):
+        return
+    now = time.time()
+    for name in os.listdir(checkpoint_dir):
+        path = os.path.join(checkpoint_dir, name)
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Removed expired checkpoint {path}")
+        except OSError:
+            continue
+
+
+class SynthesisManifest:
+    """
+    Records which lines of a podcast are synthesized and where their audio lives.
+
+    The manifest is an append-only JSON lines file next to the spooled sentences: a header with the
+    script digest followed by one entry per line, so a crash never leaves it half written.
+    A line is usable if its local file still exists or it was checkpointed to Firebase Storage.
+    """
+
+    def __init__(self, podcast_id: str, digest: str, checkpoint_dir: str = CHECKPOINT_DIR):
+        self.podcast_id = podcast_id
+        self.digest = digest
+        self.path = os.path.join(checkpoint_dir, podcast_id)
+        self.entries: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST_FILE)
+
+    @classmethod
+    def open(cls, podcast_id: str, digest: str, checkpoint_dir: str = CHECKPOINT_DIR) -> "SynthesisManifest":
+        """
+        Open the manifest of a podcast, discarding a checkpoint made for a different script.
+
+        :param podcast_id: The podcast ID.
+        :param digest: The digest of the script about to be synthesized.
+        :param checkpoint_dir: The directory of every checkpoint.
+        :return: The manifest, with the entries of a previous attempt if any.
+        """
+        prune_checkpoints(checkpoint_dir)
+        manifest = cls(podcast_id, digest, checkpoint_dir)
+        if not manifest._load():
+            shutil.rmtree(manifest.path, ignore_errors=True)
+            os.makedirs(manifest.path, exist_ok=True)
+            manifest._append({"digest": digest})
+        elif manifest.entries:
+            logger.info(f"Resuming podcast {podcast_id} from {len(manifest.entries)} checkpointed lines")
+        return manifest
+
+    def _load(self) -> bool:
+        try:
+            with open(self.manifest_path, 'r') as file:
+                content = file.read()
+        except OSError:
+            return False
+
+        records = content.splitlines()
+
+        if not records:
+            return False
+        try:
+            if json.loads(records[0]).get("digest") != self.digest:
+                logger.info(f"Script of podcast {self.podcast_id} changed, discarding its checkpoint")
+                return False
+        except ValueError:
+            return False
+
+        for record in records[1:]:
+            try:
+                entry = json.loads(record)
+            except ValueError:
+                continue  # Torn write of the last entry
+            self.entries.setdefault(entry["line"], {}).update(
+                {key: value for key, value in entry.items() if key != "line"})
+
+        if not content.endswith("\n"):
+            # Start the next entry on its own line after a torn write
+            with open(self.manifest_path, 'a') as file:
+                file.write("\n")
+        return True
+
+    def _append(self, record: Dict) -> None:
+        with open(self.manifest_path, 'a') as file:
+            file.write(json.dumps(record) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def record(self, line: int, file: Optional[str] = None, remote: bool = False) -> None:
+        """
+        Record where the audio of a synthesized line lives.
+
+        :param line: The line number.
+        :param file: The local .wav file of the line.
+        :param remote: Whether the line was checkpointed to Firebase Storage.
+        """
+        entry = {"line": line}
+        if file is not None:
+            entry["file"] = file
+        if remote:
+            entry["remote"] = True
+        with self._lock:
+            self.entries.setdefault(line, {}).update({key: value for key, value in entry.items() if key != "line"})
+            self._append(entry)
+
+    def local_lines(self) -> Dict[int, str]:
+        """The lines whose local file is still there, with the file path."""
+        with self._lock:
+            return {line: entry["file"] for line, entry in self.entries.items()
+                    if entry.get("file") and os.path.exists(entry["file"])}
+
+    def remote_lines(self, exclude: Iterable[int] = ()) -> List[int]:
+        """The lines only available from Firebase Storage."""
+        exclude = set(exclude)
+        with self._lock:
+            return sorted(line for line, entry in self.entries.items() if entry.get("remote") and line not in exclude)
+
+    def remove(self) -> None:
+        """Remove the manifest and every checkpointed file."""
+        shutil.rmtree(self.path, ignore_errors=True)
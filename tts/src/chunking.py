@@ -0,0 +1,100 @@
+# src/chunking.py
+
+import logging
+import os
+import re
+import wave
+from io import BytesIO
+from typing import Callable, List
+
+import numpy as np
+
+from src.assembly import SAMPLE_WIDTH, read_wav
+
+logger = logging.getLogger("uvicorn")
+
+# Lines with more phonemes than this are split into chunks synthesized on their own, 0 disables chunking
+CHUNK_PHONEMES = int(os.getenv('TTS_CHUNK_PHONEMES', '400'))
+# Length of the crossfade joining the chunks of a line back together
+CHUNK_CROSSFADE_MS = int(os.getenv('TTS_CHUNK_CROSSFADE_MS', '10'))
+
+# Where a line may be split, from the most to the least natural place
+SPLIT_PATTERNS = [
+    r'(?<=[.!?…])\s+',   # Sentences
+    r'(?<=[,;:—–])\s+',  # Clauses
+    r'\s+',              # Words, for run-on text without punctuation
+]
+
+
+def split_text(text: str, budget: int, count: Callable[[str], int], level: int = 0) -> List[str]:
+    """
+    Split text into chunks of at most `budget` phonemes, at the most natural punctuation available.
+
+    :param text: The text to split.
+    :param budget: The maximum number of phonemes per chunk.
+    :param count: A function counting the phonemes of a text.
+    :param level: The first split pattern to try.
+    :return: The chunks, in order. A single word over the budget is kept whole.
+    """
+    if level >= len(SPLIT_PATTERNS) or count(text) <= budget:
+        return [text]
+
+    pieces = [piece for piece in re.split(SPLIT_PATTERNS[level], text.strip()) if piece]
+    if len(pieces) == 1:
+        return split_text(text, budget, count, level + 1)
+
+    # Pack consecutive pieces into chunks, splitting pieces that are over the budget on their own further
+    chunks = []
+    current = ''
+    for piece in pieces:
+        candidate = f"{current} {piece}" if current else piece
+        if count(candidate) <= budget:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        if count(piece) <= budget:
+            current = piece
+        else:
+            chunks.extend(split_text(piece, budget, count, level + 1))
+            current = ''
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def join_wavs(wav_files: List[bytes], crossfade_ms: int = CHUNK_CROSSFADE_MS) -> bytes:
+    """
+    Join the .wav files of the chunks of a line with short linear crossfades.
+
+    :param wav_files: The .wav files, all in the format of the voice that synthesized them.
+    :param crossfade_ms: The length of each crossfade in milliseconds.
+    :return: The joined .wav file.
+    """
+    if len(wav_files) == 1:
+        return wav_files[0]
+
+    audio_format = None
+    joined = None
+    for wav_data in wav_files:
+        audio_format, samples = read_wav(wav_data)
+        samples = samples.astype(np.float32)
+        if joined is None:
+            joined = samples
+            continue
+
+        fade = min(len(joined), len(samples), int(audio_format.sample_rate * crossfade_ms / 1000))
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, endpoint=False)[:, np.newaxis]
+            overlap = joined[-fade:] * (1.0 - ramp) + samples[:fade] * ramp
+            joined = np.concatenate([joined[:-fade], overlap, samples[fade:]])
+        else:
+            joined = np.concatenate([joined, samples])
+
+    buffer = BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setframerate(audio_format.sample_rate)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setnchannels(audio_format.channels)
+        wav.writeframes(np.clip(np.rint(joined), -32768, 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
@@ -0,0 +1,216 @@
+# src/delivery.py
+
+import datetime
+import os
+import re
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import BinaryIO, Optional, Tuple, Union
+
+import anyio
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+def is_single_range(range_header: str) -> bool:
+    """
+    Whether a Range header asks for a single, well-formed byte range.
+
+    Other Range headers, such as multiple ranges, are ignored and the whole file is served.
+
+    :param range_header: The value of the Range header.
+    :return: True if the header is a single byte range.
+    """
+    match = RANGE_PATTERN.fullmatch(range_header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return False
+    start, end = match.groups()
+    return start == '' or end == '' or int(start) <= int(end)
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range of a Range header.
+
+    :param range_header: The value of the Range header, e.g. "bytes=0-1023".
+    :param size: The size of the file.
+    :return: The inclusive (start, end) of the range, or None if it is not a single range or can not be satisfied.
+    """
+    if not is_single_range(range_header):
+        return None
+
+    start, end = RANGE_PATTERN.fullmatch(range_header.strip()).groups()
+    if start == '':
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime.datetime]) -> bool:
+    """
+    Evaluate the conditional headers of a GET request.
+
+    :param request: The request.
+    :param etag: The quoted ETag of the file.
+    :param last_modified: When the file last changed.
+    :return: True if the client copy is still valid and a 304 can be sent.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime.datetime]) -> dict:
+    """
+    Build the caching headers of a file.
+
+    :param etag: The quoted ETag of the file.
+    :param last_modified: When the file last changed.
+    :return: The headers.
+    """
+    headers = {'ETag': etag, 'Accept-Ranges': 'bytes', 'Cache-Control': 'public, max-age=3600'}
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified.astimezone(datetime.timezone.utc), usegmt=True)
+    return headers
+
+
+class OpenFileResponse(Response):
+    """
+    Send a byte range of a file that is already open.
+
+    The file is opened before the response is returned, so it can be sent whole even if the disk cache
+    evicts it in the meantime. Servers with the ASGI zero-copy send extension send it with sendfile,
+    otherwise it is read with pread in a worker thread, without copying it through a Python loop over a file object.
+    """
+
+    def __init__(self, file: BinaryIO, start: int, length: int, status_code: int, media_type: str, headers: dict):
+        self.file = file
+        self.start = start
+        self.length = length
+        super().__init__(status_code=status_code, media_type=media_type,
+                         headers={**headers, 'Content-Length': str(length)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"].upper() == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            elif "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": self.file,
+                            "offset": self.start, "count": self.length, "more_body": False})
+            else:
+                offset, remaining = self.start, self.length
+                more_body = True
+                while more_body:
+                    chunk = await anyio.to_thread.run_sync(os.pread, self.file.fileno(), min(CHUNK_SIZE, remaining), offset)
+                    offset += len(chunk)
+                    remaining -= len(chunk)
+                    more_body = remaining > 0 and bool(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        finally:
+            self.file.close()
+        if self.background is not None:
+            await self.background()
+
+
+def requested_range(request: Request, etag: str, size: int) -> Union[None, Tuple[int, int], Response]:
+    """
+    Find the byte range a GET request asks for.
+
+    :param request: The request.
+    :param etag: The quoted ETag of the file.
+    :param size: The size of the file.
+    :return: None for the whole file, the inclusive (start, end) of the range,
+             or a 416 response if a single range was asked for but can not be satisfied.
+    """
+    range_header = request.headers.get('range')
+    # A Range is only honoured if the client copy, when it names one, is still the current file
+    if_range = request.headers.get('if-range')
+    if not range_header or not is_single_range(range_header) or (if_range is not None and if_range != etag):
+        return None
+    byte_range = parse_range(range_header, size)
+    if byte_range is None:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{size}', 'Accept-Ranges': 'bytes'})
+    return byte_range
+
+
+def file_response(request: Request, path: str, media_type: str, etag: str,
+                  last_modified: Optional[datetime.datetime]) -> Optional[Response]:
+    """
+    Serve a local file with Range and conditional GET support.
+
+    :param request: The request.
+    :param path: The path of the file.
+    :param media_type: The content type of the file.
+    :param etag: The quoted ETag of the file.
+    :param last_modified: When the file last changed.
+    :return: A 200, 206, 304 or 416 response, or None if the file no longer exists.
+    """
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    size = os.fstat(file.fileno()).st_size
+
+    byte_range = requested_range(request, etag, size)
+    if isinstance(byte_range, Response):
+        file.close()
+        return byte_range
+    if byte_range is None:
+        return OpenFileResponse(file, 0, size, 200, media_type, headers)
+
+    start, end = byte_range
+    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return OpenFileResponse(file, start, end - start + 1, 206, media_type, headers)
+
+
+def blob_response(request: Request, blob, media_type: str, etag: str,
+                  last_modified: Optional[datetime.datetime]) -> Response:
+    """
+    Serve a Firebase Storage blob with Range and conditional GET support, downloading only the requested bytes.
+
+    :param request: The request.
+    :param blob: The blob, with its metadata loaded.
+    :param media_type: The content type of the file.
+    :param etag: The quoted ETag of the file.
+    :param last_modified: When the file last changed.
+    :return: A 200, 206, 304 or 416 response.
+    """
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = requested_range(request, etag, blob.size)
+    if isinstance(byte_range, Response):
+        return byte_range
+    if byte_range is None:
+        return Response(content=blob.download_as_bytes(), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers['Content-Range'] = f'bytes {start}-{end}/{blob.size}'
+    content = blob.download_as_bytes(start=start, end=end)
+    return Response(content=content, status_code=206, media_type=media_type, headers=headers)
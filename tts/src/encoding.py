@@ -0,0 +1,85 @@
+# src/encoding.py
+
+import logging
+import os
+import subprocess
+from typing import List, Union
+
+logger = logging.getLogger("uvicorn")
+
+# Renditions uploaded for every podcast, the first one is the one listeners get by default
+OUTPUT_FORMATS: List[str] = [f.strip() for f in os.getenv('TTS_OUTPUT_FORMATS', 'mp3').split(',') if f.strip()]
+OUTPUT_BITRATE = os.getenv('TTS_OUTPUT_BITRATE', '64k')
+
+# Blob name and content type of every audio rendition
+AUDIO_CODECS = {
+    'wav': ('audio.wav', 'audio/wav'),
+    'mp3': ('audio.mp3', 'audio/mpeg'),
+    'opus': ('audio.opus', 'audio/ogg'),
+    'aac': ('audio.aac', 'audio/aac'),
+}
+
+# ffmpeg arguments per codec, all of them write to a pipe-friendly container
+FFMPEG_CODECS = {
+    "mp3": ['-c:a', 'libmp3lame', '-f', 'mp3'],
+    "opus": ['-c:a', 'libopus', '-ar', '48000', '-f', 'ogg'],
+    "aac": ['-c:a', 'aac', '-f', 'adts'],
+}
+
+
+def ffmpeg_command(source: str, codec: str, bitrate: str, target: str) -> List[str]:
+    """
+    Build the ffmpeg command encoding a .wav file.
+
+    :param source: The .wav file path, or "pipe:0".
+    :param codec: The codec to encode to.
+    :param bitrate: The target bitrate, e.g. "64k".
+    :param target: The output file path, or "pipe:1".
+    :return: The command.
+    """
+    if codec not in FFMPEG_CODECS:
+        raise ValueError(f"Unsupported codec: {codec}")
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'wav', '-i', source,
+        *FFMPEG_CODECS[codec], '-b:a', bitrate,
+        target,
+    ]
+
+
+def encode_audio(wav_data: Union[bytes, bytearray, memoryview], codec: str, bitrate: str = OUTPUT_BITRATE) -> bytes:
+    """
+    Encode a .wav file into a compressed format with ffmpeg.
+
+    The .wav file is piped to ffmpeg as is, pass a memoryview to avoid copying a large buffer.
+
+    :param wav_data: The .wav file as bytes or a bytes-like object.
+    :param codec: The codec to encode to ("mp3", "opus", "aac" or "wav").
+    :param bitrate: The target bitrate, e.g. "64k".
+    :return: The encoded audio as bytes.
+    """
+    if codec == "wav":
+        return bytes(wav_data)
+
+    result = subprocess.run(ffmpeg_command('pipe:0', codec, bitrate, 'pipe:1'), input=wav_data, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {codec}: {result.stderr.decode(errors='replace').strip()}")
+
+    logger.debug(f"Encoded {len(wav_data)} bytes of .wav into {len(result.stdout)} bytes of {codec}")
+    return result.stdout
+
+
+def encode_audio_file(wav_path: str, codec: str, output_path: str, bitrate: str = OUTPUT_BITRATE) -> None:
+    """
+    Encode a .wav file on disk into a compressed file, ffmpeg streams it so memory use stays flat.
+
+    :param wav_path: The path of the .wav file.
+    :param codec: The codec to encode to ("mp3", "opus" or "aac").
+    :param output_path: The path of the encoded file.
+    :param bitrate: The target bitrate, e.g. "64k".
+    """
+    result = subprocess.run(ffmpeg_command(wav_path, codec, bitrate, output_path), capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {codec}: {result.stderr.decode(errors='replace').strip()}")
+
+    logger.debug(f"Encoded {wav_path} into {os.path.getsize(output_path)} bytes of {codec}")
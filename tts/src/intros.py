@@ -0,0 +1,110 @@
+# src/intros.py
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.assembly import convert, fade_out, read_wav
+from src.voices import voices
+
+logger = logging.getLogger("uvicorn")
+
+INTRO_FOLDER = 'audios'
+INTRO_FADE_MS = 2000
+INTRO_RELOAD_INTERVAL = float(os.getenv('TTS_INTRO_RELOAD_INTERVAL', '10'))
+
+
+def voice_sample_rate(voice_type: str = "male") -> int:
+    """
+    Read the sample rate of a voice from its config, without loading the model.
+
+    :param voice_type: The type of voice ("male" or "female").
+    :return: The sample rate in Hz.
+    """
+    with open(voices[voice_type][1], 'r', encoding='utf-8') as config_file:
+        return json.load(config_file)["audio"]["sample_rate"]
+
+
+class IntroBank:
+    """
+    Intro melodies decoded, resampled to the voice format and faded out once, ready to append.
+
+    The folder is checked for changes every few seconds, so intros can be added or replaced without a restart.
+    """
+
+    def __init__(self, folder: str = INTRO_FOLDER, sample_rate: Optional[int] = None, channels: int = 1):
+        self.folder = folder
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._intros: Dict[str, Tuple[int, np.ndarray]] = {}
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _folder_signature(self) -> Tuple:
+        files = sorted(f for f in os.listdir(self.folder) if f.endswith('.wav'))
+        return tuple((f, os.stat(os.path.join(self.folder, f)).st_mtime_ns) for f in files)
+
+    def load(self) -> None:
+        """Decode and prepare every intro in the folder, replacing the ones loaded before."""
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        if self.sample_rate is None:
+            try:
+                self.sample_rate = voice_sample_rate()
+            except Exception as e:
+                logger.error(f"Error reading the voice sample rate, keeping intros as they are: {e}")
+
+        start_time = time.time()
+        signature = self._folder_signature()
+        intros = {}
+        for file_name, _ in signature:
+            try:
+                audio_format, samples = read_wav(os.path.join(self.folder, file_name))
+                sample_rate = self.sample_rate or audio_format.sample_rate
+                samples = convert(samples, audio_format.sample_rate, sample_rate, self.channels)
+                intros[file_name] = (sample_rate, fade_out(samples, sample_rate, INTRO_FADE_MS))
+            except Exception as e:
+                logger.error(f"Error loading intro melody {file_name}: {e}")
+
+        self._intros = intros
+        self._signature = signature
+        self._checked_at = time.time()
+        logger.info(f"Loaded {len(intros)} intro melodies in {time.time() - start_time:.2f}s")
+
+    def _reload_if_changed(self) -> None:
+        if self._signature is not None and time.time() - self._checked_at < INTRO_RELOAD_INTERVAL:
+            return
+        with self._lock:
+            try:
+                signature = self._folder_signature()
+            except OSError as e:
+                logger.error(f"Error checking intro folder: {e}")
+                return
+            if signature != self._signature:
+                logger.info("Intro folder changed, reloading intro melodies")
+                self._load()
+            self._checked_at = time.time()
+
+    def choice(self) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        Pick a random intro melody.
+
+        :return: The (sample rate, samples) of the intro, or None if there is none.
+        """
+        self._reload_if_changed()
+        intros = self._intros
+        if not intros:
+            return None
+        return intros[random.choice(list(intros))]
+
+
+intro_bank = IntroBank()
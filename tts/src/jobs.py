@@ -0,0 +1,157 @@
+# src/jobs.py
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from src.audio import firebase_storage, generate_podcast
+from src.models import Podcast
+from src.progress import PodcastProgress
+
+logger = logging.getLogger("uvicorn")
+
+JOB_WORKERS = int(os.getenv('TTS_JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.getenv('TTS_JOB_QUEUE_SIZE', '16'))
+JOB_TTL = int(os.getenv('TTS_JOB_TTL', '3600'))  # Seconds finished jobs are kept for status queries
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while every worker is busy and the queue is full."""
+    pass
+
+
+class Job:
+    def __init__(self, podcast: Podcast):
+        self.job_id = str(uuid.uuid4())
+        self.podcast = podcast
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.progress = PodcastProgress()
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "user_id": self.podcast.user_id,
+            "podcast_id": self.podcast.podcast_id,
+            "status": self.status,
+            "error": self.error,
+            "progress": self.progress.to_dict(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs podcast generation off the event loop on a bounded pool of workers.
+
+    At most `workers + queue_size` jobs are accepted at once, further submissions are rejected
+    so the caller can back off instead of piling work onto the service.
+    A podcast has at most one queued or running job, submitting it again returns that job.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='podcast-job')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, podcast: Podcast) -> Job:
+        """
+        Queue a podcast for generation, unless it is already queued or running.
+
+        :param podcast: The Podcast object containing podcast information.
+        :return: The queued job, or the active job of the podcast.
+        :raises JobQueueFull: If the queue is full.
+        """
+        with self._lock:
+            active = self._active(podcast.podcast_id)
+            if active is not None:
+                logger.info(f"Podcast {podcast.podcast_id} already has job {active.job_id} {active.status}")
+                return active
+
+            if not self._slots.acquire(blocking=False):
+                raise JobQueueFull(f"{self.workers + self.queue_size} podcasts are already queued or running")
+
+            job = Job(podcast)
+            self._prune()
+            self._jobs[job.job_id] = job
+
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued job {job.job_id} for podcast {podcast.podcast_id}")
+        return job
+
+    def _run(self, job: Job) -> None:
+        try:
+            job.status = "running"
+            job.started_at = time.time()
+            # An earlier upload of the podcast may still be there, only this run's outcome counts
+            if not generate_podcast(job.podcast, job.progress):
+                raise RuntimeError("Podcast audio was not generated")
+
+            job.status = "done"
+            job.progress.set_stage("done")
+        except Exception as e:
+            logger.error(f"Error generating podcast {job.podcast.podcast_id}: {e}")
+            job.status = "error"
+            job.error = str(e)
+            job.progress.set_stage("error")
+            try:
+                firebase_storage.set_error(job.podcast.user_id, job.podcast.podcast_id)
+            except Exception as e:
+                logger.error(f"Error setting podcast status: {e}")
+        finally:
+            job.progress.finish()
+            job.finished_at = time.time()
+            self._slots.release()
+
+    def _prune(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and now - job.finished_at > JOB_TTL]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _active(self, podcast_id: str) -> Optional[Job]:
+        """The queued or running job of a podcast, the lock must be held."""
+        for job in self._jobs.values():
+            if job.podcast.podcast_id == podcast_id and job.status in ("queued", "running"):
+                return job
+        return None
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def find(self, podcast_id: str) -> Optional[Job]:
+        """The most recent job of a podcast."""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.podcast.podcast_id == podcast_id]
+        return max(jobs, key=lambda job: job.created_at) if jobs else None
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self) -> Dict:
+        jobs = self.list()
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "running": sum(1 for job in jobs if job.status == "running"),
+            "queued": sum(1 for job in jobs if job.status == "queued"),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_manager = JobManager()
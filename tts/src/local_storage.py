@@ -0,0 +1,129 @@
+# src/local_storage.py
+
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from src.encoding import AUDIO_CODECS
+
+logger = logging.getLogger("uvicorn")
+
+
+class LocalStorage:
+    """
+    Stand-in for FirebaseStorage that keeps podcasts in a local directory, for benchmarks and offline runs.
+
+    Documents are JSON files under `podcasts/{podcast_id}.json`, blobs use the same paths as in the bucket.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'podcasts'), exist_ok=True)
+
+    def _path(self, blob_name: str) -> str:
+        return os.path.join(self.root, *blob_name.split('/'))
+
+    def _write(self, blob_name: str, data: bytes) -> None:
+        path = self._path(blob_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+
+    def _read(self, blob_name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(blob_name), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _document_path(self, podcast_id: str) -> str:
+        return os.path.join(self.root, 'podcasts', f'{podcast_id}.json')
+
+    def get_document(self, podcast_id: str) -> Optional[dict]:
+        try:
+            with open(self._document_path(podcast_id), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _update_document(self, podcast_id: str, fields: dict) -> None:
+        with self._lock:
+            document = self.get_document(podcast_id) or {}
+            document.update(fields)
+            with open(self._document_path(podcast_id), 'w', encoding='utf-8') as file:
+                json.dump(document, file)
+
+    def save_script(self, user_id: str, podcast_id: str, script: dict):
+        self._update_document(podcast_id, {'user_id': user_id, 'script': script, 'status': 'pending'})
+
+    def get_script(self, user_id: str, podcast_id: str) -> dict:
+        document = self.get_document(podcast_id)
+        if document is not None:
+            return document.get('script')
+
+    def save_audio(self, user_id: str, podcast_id: str, audio_data: bytes, codec: str = 'wav'):
+        self._write(f'podcasts/{podcast_id}/{AUDIO_CODECS[codec][0]}', audio_data)
+
+    def save_audio_file(self, user_id: str, podcast_id: str, file_path: str, codec: str = 'wav'):
+        path = self._path(f'podcasts/{podcast_id}/{AUDIO_CODECS[codec][0]}')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(file_path, path)
+
+    def set_ready(self, user_id: str, podcast_id: str, metadata: dict):
+        self._update_document(podcast_id, {'status': 'ready', **metadata})
+
+    def set_error(self, user_id: str, podcast_id: str):
+        self._update_document(podcast_id, {'status': 'error'})
+
+    def get_audio_codec(self, user_id: str, podcast_id: str) -> str:
+        return (self.get_document(podcast_id) or {}).get('codec', 'wav')
+
+    def audio_exists(self, user_id: str, podcast_id: str) -> bool:
+        codec = self.get_audio_codec(user_id, podcast_id)
+        return os.path.exists(self._path(f'podcasts/{podcast_id}/{AUDIO_CODECS[codec][0]}'))
+
+    def get_audio(self, user_id: str, podcast_id: str, codec: str = None) -> bytes:
+        if codec is None:
+            codec = self.get_audio_codec(user_id, podcast_id)
+        return self._read(f'podcasts/{podcast_id}/{AUDIO_CODECS[codec][0]}')
+
+    # Temp audio files
+    def list_temp_audio_files(self, user_id: str, podcast_id: str) -> list:
+        prefix = f'temp/{user_id}/{podcast_id}'
+        path = self._path(prefix)
+        if not os.path.isdir(path):
+            return []
+        return [f'{prefix}/{file_name}' for file_name in sorted(os.listdir(path))]
+
+    def get_temp_audio_file(self, user_id: str, podcast_id: str, file_name: str) -> bytes:
+        return self._read(f'temp/{user_id}/{podcast_id}/{file_name}')
+
+    def get_temp_audio_files(self, user_id: str, podcast_id: str, file_names: List[str]) -> Dict[str, Optional[bytes]]:
+        return {file_name: self.get_temp_audio_file(user_id, podcast_id, file_name) for file_name in file_names}
+
+    def save_temp_audio_file(self, user_id: str, podcast_id: str, file_name: str, audio_data: bytes):
+        self._write(f'temp/{user_id}/{podcast_id}/{file_name}', audio_data)
+
+    def save_temp_audio_file_async(self, user_id: str, podcast_id: str, file_name: str, audio_data: bytes):
+        future = Future()
+        try:
+            self.save_temp_audio_file(user_id, podcast_id, file_name, audio_data)
+            future.set_result(None)
+        except OSError as e:
+            future.set_exception(e)
+        return future
+
+    def get_temp_manifest(self, user_id: str, podcast_id: str) -> Optional[dict]:
+        data = self.get_temp_audio_file(user_id, podcast_id, 'manifest.json')
+        return json.loads(data) if data else None
+
+    def save_temp_manifest(self, user_id: str, podcast_id: str, manifest: dict):
+        self._write(f'temp/{user_id}/{podcast_id}/manifest.json', json.dumps(manifest).encode('utf-8'))
+
+    def remove_temp_audio_files(self, user_id: str, podcast_id: str):
+        shutil.rmtree(self._path(f'temp/{user_id}/{podcast_id}'), ignore_errors=True)
@@ -0,0 +1,124 @@
+# src/progress.py
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Let listeners play the synthesized sentences of running jobs before the podcast is done
+STREAMING_ENABLED = os.getenv('TTS_STREAMING_ENABLED', 'true').lower() == 'true'
+
+
+class PodcastProgress:
+    """Tracks how far the generation of a podcast has gone, shared between the job worker and the API."""
+
+    def __init__(self):
+        self.stage = "queued"
+        self.total_sentences = 0
+        self.done_sentences = 0
+        self.started_at: Optional[float] = None
+        self.finished = False
+        # Line numbers synthesized so far in line order, the audio itself is read from the spool of the job
+        self.lines: List[int] = []
+        self.spool = None
+        self.listeners = 0
+        self._release: Optional[Callable[[], None]] = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage: str) -> None:
+        self.stage = stage
+
+    def start(self, total_sentences: int) -> None:
+        """
+        Start counting synthesized sentences.
+
+        :param total_sentences: The number of sentences in the podcast.
+        """
+        with self._lock:
+            self.stage = "synthesizing"
+            self.total_sentences = total_sentences
+            self.done_sentences = 0
+            self.started_at = time.time()
+
+    def attach(self, spool) -> None:
+        """
+        Let streaming listeners read sentences from the spool of the job.
+
+        :param spool: The AudioSpool the sentences are stored in.
+        """
+        self.spool = spool
+
+    def advance(self, line: int) -> None:
+        """
+        Mark a sentence as synthesized. Sentences must be advanced in line order, once they are in the spool.
+
+        :param line: The line number of the sentence.
+        """
+        with self._lock:
+            self.done_sentences += 1
+            if STREAMING_ENABLED and self.spool is not None and not self.finished:
+                self.lines.append(line)
+
+    def read(self, line: int) -> Optional[bytes]:
+        """
+        Read a synthesized sentence for a streaming listener.
+
+        :param line: The line number of the sentence.
+        :return: The .wav file as bytes, or None if it is no longer stored.
+        """
+        wav_data = self.spool.get(line) if self.spool is not None else None
+        if isinstance(wav_data, str):
+            try:
+                with open(wav_data, 'rb') as file:
+                    return file.read()
+            except OSError:
+                return None
+        return wav_data
+
+    def finish(self) -> None:
+        """Mark synthesis as over, no more sentences will be added."""
+        with self._lock:
+            self.finished = True
+
+    def release(self, cleanup: Callable[[], None]) -> None:
+        """
+        Release the sentences of the job once no listener is reading them.
+
+        :param cleanup: Called right away, or when the last listener leaves.
+        """
+        with self._lock:
+            if self.listeners:
+                self._release = cleanup
+                return
+        cleanup()
+
+    def open_stream(self) -> None:
+        with self._lock:
+            self.listeners += 1
+
+    def close_stream(self) -> None:
+        with self._lock:
+            self.listeners -= 1
+            # The last listener of a finished podcast releases the sentences
+            cleanup = self._release if self.finished and not self.listeners else None
+            if cleanup is not None:
+                self._release = None
+        if cleanup is not None:
+            cleanup()
+
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until every sentence is synthesized, from the rate so far."""
+        with self._lock:
+            if not self.started_at or not self.done_sentences:
+                return None
+            elapsed = time.time() - self.started_at
+            return elapsed / self.done_sentences * (self.total_sentences - self.done_sentences)
+
+    def to_dict(self) -> Dict:
+        eta = self.eta()
+        return {
+            "stage": self.stage,
+            "total_sentences": self.total_sentences,
+            "done_sentences": self.done_sentences,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+        }
@@ -0,0 +1,140 @@
+# src/runtime.py
+
+import logging
+import os
+from typing import Dict, List, Optional
+
+import onnxruntime
+
+logger = logging.getLogger("uvicorn")
+
+# onnxruntime session settings of every voice, 0 threads lets the core partitioner decide
+ORT_INTRA_THREADS = int(os.getenv('TTS_ORT_INTRA_THREADS', '0'))
+ORT_INTER_THREADS = int(os.getenv('TTS_ORT_INTER_THREADS', '1'))
+ORT_GRAPH_OPTIMIZATION = os.getenv('TTS_ORT_GRAPH_OPTIMIZATION', 'all')  # "disable", "basic", "extended" or "all"
+ORT_EXECUTION_MODE = os.getenv('TTS_ORT_EXECUTION_MODE', 'sequential')  # "sequential" or "parallel"
+ORT_CPU_ARENA = os.getenv('TTS_ORT_CPU_ARENA', 'true').lower() == 'true'
+ORT_USE_CUDA = os.getenv('TTS_ORT_USE_CUDA', 'true').lower() == 'true'
+# Pin every synthesis worker to its own share of the cores
+PIN_CORES = os.getenv('TTS_PIN_CORES', 'false').lower() == 'true'
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+EXECUTION_MODES = {
+    "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def available_cores() -> List[int]:
+    """The cores this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(cores: List[int], workers: int) -> List[List[int]]:
+    """
+    Divide cores between workers in contiguous blocks, so that workers do not compete for the same cores.
+
+    With more workers than cores, workers share cores round robin.
+
+    :param cores: The cores to divide.
+    :param workers: The number of workers.
+    :return: The cores of every worker.
+    """
+    workers = max(1, workers)
+    if workers >= len(cores):
+        return [[cores[index % len(cores)]] for index in range(workers)]
+
+    size, extra = divmod(len(cores), workers)
+    partitions = []
+    start = 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        partitions.append(cores[start:end])
+        start = end
+    return partitions
+
+
+def intra_threads(cores: int) -> int:
+    """The intra-op threads of a session that owns `cores` cores."""
+    return ORT_INTRA_THREADS or max(1, cores)
+
+
+def session_options(threads: Optional[int] = None) -> onnxruntime.SessionOptions:
+    """
+    Build the onnxruntime session options of a voice.
+
+    :param threads: The intra-op threads, the configured value or onnxruntime's default if None.
+    :return: The session options.
+    """
+    options = onnxruntime.SessionOptions()
+    threads = ORT_INTRA_THREADS or threads
+    if threads:
+        options.intra_op_num_threads = threads
+    options.inter_op_num_threads = ORT_INTER_THREADS
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[ORT_GRAPH_OPTIMIZATION]
+    options.execution_mode = EXECUTION_MODES[ORT_EXECUTION_MODE]
+    options.enable_cpu_mem_arena = ORT_CPU_ARENA
+    return options
+
+
+def create_session(model_path: str, threads: Optional[int] = None) -> onnxruntime.InferenceSession:
+    """
+    Create the onnxruntime session of a voice model with the configured options.
+
+    :param model_path: The path of the .onnx model.
+    :param threads: The intra-op threads, the configured value or onnxruntime's default if None.
+    :return: The session.
+    """
+    providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if ORT_USE_CUDA else ["CPUExecutionProvider"]
+    return onnxruntime.InferenceSession(str(model_path), sess_options=session_options(threads), providers=providers)
+
+
+def apply_worker_layout(index: int, workers: int) -> int:
+    """
+    Pin the calling worker to its share of the cores, if enabled.
+
+    Sessions created afterwards by the same thread start their thread pools on these cores.
+
+    :param index: The index of the worker.
+    :param workers: The number of workers.
+    :return: The number of cores of the worker, to size its intra-op thread pool.
+    """
+    cores = partition_cores(available_cores(), workers)[index % max(1, workers)]
+    if PIN_CORES and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            logger.warning(f"Could not pin synthesis worker {index} to cores {cores}: {e}")
+    return len(cores)
+
+
+def layout_report(workers: int, pool: str) -> Dict:
+    """
+    Describe how synthesis workers and onnxruntime sessions are laid out on the host.
+
+    :param workers: The number of synthesis workers.
+    :param pool: The kind of synthesis pool ("process" or "thread").
+    :return: The layout.
+    """
+    cores = available_cores()
+    partitions = partition_cores(cores, workers)
+    return {
+        "cores": len(cores),
+        "workers": workers,
+        "pool": pool,
+        "pinned": PIN_CORES,
+        "worker_cores": partitions,
+        "intra_op_threads": [intra_threads(len(partition)) for partition in partitions],
+        "inter_op_threads": ORT_INTER_THREADS,
+        "graph_optimization": ORT_GRAPH_OPTIMIZATION,
+        "execution_mode": ORT_EXECUTION_MODE,
+        "cpu_arena": ORT_CPU_ARENA,
+        "providers": onnxruntime.get_available_providers(),
+    }
@@ -0,0 +1,227 @@
+# src/scheduler.py
+
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("uvicorn")
+
+# Units handed to the synthesis pool at once, the rest wait in the scheduler where they can be reordered
+SCHEDULER_INFLIGHT = int(os.getenv('TTS_SCHEDULER_INFLIGHT', '0'))  # 0: twice the number of workers
+# Optional per-user weights, e.g. "user-a:2,user-b:0.5", users not listed have a weight of 1
+USER_PRIORITIES = os.getenv('TTS_USER_PRIORITIES', '')
+
+# Completed units whose latency is kept for the percentiles
+LATENCY_WINDOW = 4096
+
+# (chunk id, voice type, text) of the chunks synthesized together
+Unit = List[Tuple[Tuple[int, int], str, str]]
+
+
+def parse_priorities(priorities: str) -> Dict[str, float]:
+    """
+    Parse a "user:weight,user:weight" list of user weights.
+
+    :param priorities: The list.
+    :return: The weight of every listed user.
+    """
+    weights = {}
+    for item in priorities.split(','):
+        if ':' not in item:
+            continue
+        user_id, weight = item.rsplit(':', 1)
+        try:
+            weights[user_id.strip()] = max(float(weight), 0.01)
+        except ValueError:
+            logger.warning(f"Ignoring invalid priority {item!r}")
+    return weights
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    :param values: The values, sorted.
+    :param percent: The percentile, from 0 to 100.
+    :return: The percentile, 0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1))
+    return values[rank]
+
+
+def unit_cost(unit: Unit) -> int:
+    """Synthesis time grows with the text length, so that is what a unit costs."""
+    return max(1, sum(len(sentence) for _, _, sentence in unit))
+
+
+class ScheduledJob:
+    """The sentence units of one job waiting for the synthesis pool, with its throughput."""
+
+    def __init__(self, job_id: str, user_id: Optional[str], weight: float, group: Optional[str] = None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.group = group
+        self.weight = weight
+        self.pending: Deque[Tuple[Unit, Future]] = deque()
+        self.last_tag = 0.0
+        self.inflight = 0
+        self.sentences = 0
+        self.done_sentences = 0
+        self.created_at = time.time()
+
+    def to_dict(self) -> Dict:
+        elapsed = time.time() - self.created_at
+        return {
+            "job_id": self.job_id,
+            "group": self.group,
+            "user_id": self.user_id,
+            "weight": self.weight,
+            "queued_units": len(self.pending),
+            "inflight_units": self.inflight,
+            "sentences": self.sentences,
+            "done_sentences": self.done_sentences,
+            "sentences_per_second": round(self.done_sentences / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+class FairScheduler:
+    """
+    Interleaves the sentence units of concurrent jobs on a shared pool with weighted fair queuing.
+
+    Only a few units are handed to the pool at a time. Whenever one finishes, the next unit is taken from
+    the job with the smallest virtual finish time, which grows with the text already scheduled for the job
+    divided by its weight. A long script can not starve a short one, it only gets its fair share of workers.
+    """
+
+    def __init__(self, run: Callable[[Unit], List], executor_factory: Callable[[], Executor], inflight: int):
+        self._run = run
+        self._executor_factory = executor_factory
+        self.inflight_limit = max(1, inflight)
+        self.weights = parse_priorities(USER_PRIORITIES)
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._inflight = 0
+        self._virtual_time = 0.0
+        # Seconds from dispatch to completion of the last units, per sentence of the unit
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, units: List[Unit], job_id: Optional[str] = None, user_id: Optional[str] = None,
+               group: Optional[str] = None) -> List[Future]:
+        """
+        Queue the units of a job.
+
+        :param units: The units, in the order the job needs them.
+        :param job_id: Identifies the job, units of the same job are run in order. Must be unique per caller,
+                       cancelling a job drops the units of everyone that submitted under its ID.
+        :param user_id: The user of the job, to apply its priority.
+        :param group: What the job belongs to, e.g. the podcast ID, only reported in the stats.
+        :return: A future of the results of each unit.
+        """
+        job_id = job_id or f"job-{next(self._ids)}"
+        futures = [Future() for _ in units]
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = ScheduledJob(job_id, user_id, self.weights.get(user_id, 1.0), group)
+                job.last_tag = self._virtual_time
+            job.pending.extend(zip(units, futures))
+            job.sentences += sum(len(unit) for unit in units)
+        self._dispatch()
+        return futures
+
+    def cancel(self, job_id: str) -> None:
+        """Drop the units of a job that were not started."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for _, future in job.pending:
+                future.cancel()
+            job.pending.clear()
+            if not job.inflight:
+                del self._jobs[job_id]
+
+    def _next(self) -> Optional[Tuple[ScheduledJob, Unit, Future]]:
+        """Pop the unit with the smallest virtual finish time, the lock must be held."""
+        best = None
+        best_tag = None
+        for job in self._jobs.values():
+            if not job.pending:
+                continue
+            tag = max(self._virtual_time, job.last_tag) + unit_cost(job.pending[0][0]) / job.weight
+            if best_tag is None or tag < best_tag:
+                best, best_tag = job, tag
+        if best is None:
+            return None
+
+        unit, future = best.pending.popleft()
+        best.last_tag = best_tag
+        self._virtual_time = max(self._virtual_time, best_tag - unit_cost(unit) / best.weight)
+        return best, unit, future
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._lock:
+                if self._inflight >= self.inflight_limit:
+                    return
+                item = self._next()
+                if item is None:
+                    return
+                job, unit, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._inflight += 1
+                job.inflight += 1
+
+            started_at = time.time()
+            try:
+                pool_future = self._executor_factory().submit(self._run, unit)
+            except Exception as e:
+                self._complete(job, unit, future, started_at, None, e)
+                continue
+            pool_future.add_done_callback(
+                lambda done, job=job, unit=unit, future=future, started_at=started_at:
+                    self._complete(job, unit, future, started_at, done))
+
+    def _complete(self, job: ScheduledJob, unit: Unit, future: Future, started_at: float,
+                  pool_future: Optional[Future], error: Optional[BaseException] = None) -> None:
+        if pool_future is not None:
+            error = pool_future.exception() if not pool_future.cancelled() else RuntimeError("Synthesis cancelled")
+
+        with self._lock:
+            self._inflight -= 1
+            job.inflight -= 1
+            if error is None:
+                job.done_sentences += len(unit)
+                self.latencies.append((time.time() - started_at) / len(unit))
+            if not job.pending and not job.inflight:
+                self._jobs.pop(job.job_id, None)
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(pool_future.result())
+        self._dispatch()
+
+    def stats(self) -> Dict:
+        """Queue depth, units in the pool and the throughput of every job."""
+        with self._lock:
+            jobs = [job.to_dict() for job in self._jobs.values()]
+            latencies = sorted(self.latencies)
+            return {
+                "latency_p50": round(percentile(latencies, 50), 3),
+                "latency_p99": round(percentile(latencies, 99), 3),
+                "inflight_units": self._inflight,
+                "inflight_limit": self.inflight_limit,
+                "queued_units": sum(job["queued_units"] for job in jobs),
+                "jobs": jobs,
+            }
@@ -0,0 +1,77 @@
+# src/spool.py
+
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Union
+
+logger = logging.getLogger("uvicorn")
+
+SPOOL_DIR = os.getenv('TTS_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'podai-spool'))
+
+
+class AudioSpool:
+    """
+    Holds the synthesized sentences of one podcast until they are assembled.
+
+    Sentences are kept in memory, or written to a local spool directory when one is given,
+    so nothing has to round-trip through Firebase Storage before the final upload.
+    """
+
+    def __init__(self, podcast_id: str, spool_dir: Optional[str] = None):
+        self.podcast_id = podcast_id
+        self.path = os.path.join(spool_dir, podcast_id) if spool_dir else None
+        self._lines: Dict[int, Union[bytes, str]] = {}
+
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+
+    def add(self, line: int, wav_data: bytes) -> None:
+        """
+        Store a synthesized sentence.
+
+        :param line: The line number of the sentence.
+        :param wav_data: The .wav file as bytes.
+        """
+        if self.path:
+            file_path = os.path.join(self.path, f"{line:04}.wav")
+            with open(file_path, 'wb') as file:
+                file.write(wav_data)
+            self._lines[line] = file_path
+        else:
+            self._lines[line] = wav_data
+
+    def restore(self, line: int, file_path: str) -> None:
+        """
+        Register a sentence already written to disk by a previous attempt.
+
+        :param line: The line number of the sentence.
+        :param file_path: The .wav file of the sentence.
+        """
+        self._lines[line] = file_path
+
+    def get(self, line: int) -> Optional[Union[bytes, str]]:
+        """The stored sentence of a line, as bytes or as a spool file path."""
+        return self._lines.get(line)
+
+    def __contains__(self, line: int) -> bool:
+        return line in self._lines
+
+    def lines(self) -> List[int]:
+        """The line numbers of the stored sentences, in order."""
+        return sorted(self._lines)
+
+    def files(self) -> List[Union[bytes, str]]:
+        """The stored sentences in line order, as bytes or as spool file paths."""
+        return [self._lines[line] for line in sorted(self._lines)]
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def cleanup(self) -> None:
+        """Drop every stored sentence and remove the spool directory."""
+        self._lines.clear()
+        if self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+            logger.debug(f"Removed spool directory {self.path}")
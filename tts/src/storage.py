@@ -2,15 +2,49 @@
 
 import firebase_admin
 from firebase_admin import credentials, storage, firestore
+from google.api_core import exceptions as api_exceptions
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import storage as cloud_storage
 from google.cloud.exceptions import NotFound
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 import json
+import logging
 import os
-from pydub import AudioSegment
-from io import BytesIO
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.encoding import AUDIO_CODECS
+
+logger = logging.getLogger("uvicorn")
 
 FIREBASE_KEY = os.environ.get('FIREBASE_KEY')
 STORAGE_BUCKET = os.getenv('FIREBASE_STORAGE_BUCKET')
 
+# Concurrent transfers of the bulk operations, also the size of the HTTP connection pool
+TRANSFER_WORKERS = int(os.getenv('TTS_STORAGE_WORKERS', '16'))
+TRANSFER_RETRIES = int(os.getenv('TTS_STORAGE_RETRIES', '4'))
+TRANSFER_BACKOFF = float(os.getenv('TTS_STORAGE_BACKOFF', '0.5'))  # Seconds before the first retry, doubled after each
+# Chunk size of resumable uploads, a failed chunk is retried instead of the whole file (multiple of 256 KB)
+UPLOAD_CHUNK_SIZE = int(os.getenv('TTS_UPLOAD_CHUNK_MB', '8')) * 1024 * 1024
+# Cloud Storage batch requests are limited, stay well below it
+DELETE_BATCH_SIZE = 100
+
+# Errors worth retrying, anything else (e.g. NotFound) fails right away
+TRANSIENT_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.InternalServerError,
+    api_exceptions.BadGateway,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.GatewayTimeout,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
 class FirebaseStorage:
     def __init__(self):
         # Initialize Firebase app if not already initialized
@@ -23,8 +57,118 @@ class FirebaseStorage:
                 'storageBucket': STORAGE_BUCKET
             })
         
-        self.bucket = storage.bucket()
+        self.bucket = self._create_bucket()
         self.db = firestore.client()
+        self._pool = ThreadPoolExecutor(max_workers=TRANSFER_WORKERS, thread_name_prefix='storage')
+
+    def _create_bucket(self):
+        """
+        The storage bucket of the Firebase app, with a client whose connection pool lets every
+        transfer worker keep its own connection open instead of reconnecting each time.
+        """
+        app = firebase_admin.get_app()
+        try:
+            credential = app.credential.get_credential()
+            session = AuthorizedSession(credential)
+            adapter = HTTPAdapter(pool_connections=TRANSFER_WORKERS, pool_maxsize=TRANSFER_WORKERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            client = cloud_storage.Client(project=app.project_id, credentials=credential, _http=session)
+            return client.bucket(app.options.get('storageBucket'))
+        except Exception as e:
+            logger.warning(f"Could not create a storage client with a larger connection pool: {e}")
+            return storage.bucket()
+
+    def _retry(self, operation: Callable, *args, **kwargs):
+        """
+        Run a storage operation, retrying transient errors with exponential backoff and jitter.
+
+        :param operation: The operation to run.
+        :return: The result of the operation.
+        """
+        for attempt in range(TRANSFER_RETRIES + 1):
+            try:
+                return operation(*args, **kwargs)
+            except TRANSIENT_ERRORS as e:
+                if attempt == TRANSFER_RETRIES:
+                    raise
+                delay = TRANSFER_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning(f"Storage operation failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _download(self, blob_name: str) -> Optional[bytes]:
+        try:
+            return self._retry(self.bucket.blob(blob_name).download_as_bytes)
+        except NotFound:
+            return None
+
+    def download_many(self, blob_names: List[str]) -> Dict[str, Optional[bytes]]:
+        """
+        Download blobs concurrently.
+
+        :param blob_names: The names of the blobs.
+        :return: The content of each blob by name, None for missing or failed blobs.
+        """
+        results = {}
+        futures = {name: self._pool.submit(self._download, name) for name in blob_names}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"Error downloading {name}: {e}")
+                results[name] = None
+        return results
+
+    def download_many_to_files(self, blob_names: Dict[str, str]) -> None:
+        """
+        Download blobs concurrently to local files.
+
+        :param blob_names: The local path of each blob by name.
+        """
+        futures = [
+            self._pool.submit(self._retry, self.bucket.blob(name).download_to_filename, path)
+            for name, path in blob_names.items()
+        ]
+        for future in futures:
+            future.result()
+
+    def upload_async(self, blob_name: str, data: bytes, content_type: str):
+        """
+        Upload a blob in the background.
+
+        :param blob_name: The name of the blob.
+        :param data: The content of the blob.
+        :param content_type: The content type of the blob.
+        :return: A future of the upload.
+        """
+        blob = self.bucket.blob(blob_name)
+        return self._pool.submit(self._retry, blob.upload_from_string, data, content_type=content_type)
+
+    def _delete(self, blob_name: str) -> None:
+        try:
+            self._retry(self.bucket.blob(blob_name).delete)
+        except NotFound:
+            pass
+
+    def delete_many(self, blob_names: List[str]) -> None:
+        """
+        Delete blobs with batch requests of up to DELETE_BATCH_SIZE deletions.
+
+        A batch only reports its first failed deletion, so the blobs of a failed batch are deleted
+        again one by one, retrying transient errors and ignoring blobs that are already gone.
+
+        :param blob_names: The names of the blobs.
+        """
+        for start in range(0, len(blob_names), DELETE_BATCH_SIZE):
+            chunk = blob_names[start:start + DELETE_BATCH_SIZE]
+            try:
+                with self.bucket.client.batch(raise_exception=True):
+                    for name in chunk:
+                        self.bucket.blob(name).delete()
+            except (api_exceptions.GoogleAPICallError,) + TRANSIENT_ERRORS as e:
+                logger.warning(f"Batch deletion of {len(chunk)} blobs failed ({e}), deleting them one by one")
+                for future in [self._pool.submit(self._delete, name) for name in chunk]:
+                    future.result()
 
     def get_script(self, user_id: str, podcast_id: str) -> dict:
         doc_ref = self.db.collection('podcasts').document(podcast_id)
@@ -32,26 +176,49 @@ class FirebaseStorage:
         if doc.exists:
             return doc.to_dict()['script']
 
-    def save_audio(self, user_id: str, podcast_id: str, audio_data: bytes):
+    def save_audio(self, user_id: str, podcast_id: str, audio_data: bytes, codec: str = 'wav'):
         # Crear la ruta del blob con la estructura deseada
-        blob = self.bucket.blob(f'podcasts/{podcast_id}/audio.wav')
-        blob.upload_from_string(audio_data, content_type='audio/wav')
+        file_name, content_type = AUDIO_CODECS[codec]
+        blob = self.bucket.blob(f'podcasts/{podcast_id}/{file_name}')
+        blob.upload_from_string(audio_data, content_type=content_type)
 
-        # Calcular la duración del audio
-        audio = AudioSegment.from_wav(BytesIO(audio_data))
-        duration = len(audio) / 1000.0  # Duración en segundos
+    def save_audio_file(self, user_id: str, podcast_id: str, file_path: str, codec: str = 'wav'):
+        """Upload an audio rendition from a local file with a chunked, resumable upload"""
+        file_name, content_type = AUDIO_CODECS[codec]
+        blob = self.bucket.blob(f'podcasts/{podcast_id}/{file_name}', chunk_size=UPLOAD_CHUNK_SIZE)
+        self._retry(blob.upload_from_filename, file_path, content_type=content_type)
 
+    def set_ready(self, user_id: str, podcast_id: str, metadata: dict):
+        """Set podcast status to ready along with the audio metadata computed while assembling it"""
         doc_ref = self.db.collection('podcasts').document(podcast_id)
 
         # Actualizar el documento con la duración del audio
         doc_ref.update({
             'status': 'ready',
-            'duration': duration
+            **metadata,
         })
 
-    def get_audio(self, user_id: str, podcast_id: str) -> bytes:
+    def get_audio_codec(self, user_id: str, podcast_id: str) -> str:
+        """Get the default codec of a podcast, podcasts generated before codecs were recorded are .wav"""
+        doc = self.db.collection('podcasts').document(podcast_id).get()
+        if doc.exists:
+            return doc.to_dict().get('codec', 'wav')
+        return 'wav'
+
+    def audio_exists(self, user_id: str, podcast_id: str) -> bool:
+        """Check that the default rendition of a podcast was uploaded, without downloading it"""
+        codec = self.get_audio_codec(user_id, podcast_id)
+        return self.bucket.blob(f'podcasts/{podcast_id}/{AUDIO_CODECS[codec][0]}').exists()
+
+    def get_audio_blob(self, user_id: str, podcast_id: str, codec: str):
+        """Get the blob of an audio rendition with its metadata (etag, generation, size), or None if missing"""
+        return self.bucket.get_blob(f'podcasts/{podcast_id}/{AUDIO_CODECS[codec][0]}')
+
+    def get_audio(self, user_id: str, podcast_id: str, codec: str = None) -> bytes:
+        if codec is None:
+            codec = self.get_audio_codec(user_id, podcast_id)
         # Crear la ruta del blob con la estructura deseada
-        blob = self.bucket.blob(f'podcasts/{podcast_id}/audio.wav')
+        blob = self.bucket.blob(f'podcasts/{podcast_id}/{AUDIO_CODECS[codec][0]}')
         try:
             return blob.download_as_bytes()
         except NotFound:
@@ -70,23 +237,43 @@ class FirebaseStorage:
         except NotFound:
             return None
     
+    def get_temp_audio_files(self, user_id: str, podcast_id: str, file_names: List[str]) -> Dict[str, Optional[bytes]]:
+        """Download several temp audio files concurrently, None for the ones that could not be loaded"""
+        prefix = f'temp/{user_id}/{podcast_id}/'
+        data = self.download_many([prefix + file_name for file_name in file_names])
+        return {file_name: data[prefix + file_name] for file_name in file_names}
+    
     def save_temp_audio_file(self, user_id: str, podcast_id: str, file_name: str, audio_data: bytes):
         blob = self.bucket.blob(f'temp/{user_id}/{podcast_id}/{file_name}')
-        blob.upload_from_string(audio_data, content_type='audio/wav')
+        self._retry(blob.upload_from_string, audio_data, content_type='audio/wav')
+
+    def save_temp_audio_file_async(self, user_id: str, podcast_id: str, file_name: str, audio_data: bytes):
+        """Upload a temp audio file in the background, returns the future of the upload"""
+        return self.upload_async(f'temp/{user_id}/{podcast_id}/{file_name}', audio_data, 'audio/wav')
+    
+    def get_temp_manifest(self, user_id: str, podcast_id: str) -> Optional[dict]:
+        """Get the checkpoint manifest stored with the temp audio files, None if there is none"""
+        data = self.get_temp_audio_file(user_id, podcast_id, 'manifest.json')
+        return json.loads(data) if data else None
+
+    def save_temp_manifest(self, user_id: str, podcast_id: str, manifest: dict):
+        blob = self.bucket.blob(f'temp/{user_id}/{podcast_id}/manifest.json')
+        self._retry(blob.upload_from_string, json.dumps(manifest), content_type='application/json')
     
     def remove_temp_audio_files(self, user_id: str, podcast_id: str):
         blobs = self.bucket.list_blobs(prefix=f'temp/{user_id}/{podcast_id}/')
-        for blob in blobs:
-            blob.delete()
+        self.delete_many([blob.name for blob in blobs])
 
 
     def download_voices(self):
         voices_folder = 'voices/'
         blobs = self.bucket.list_blobs(prefix='voices/')
+        files = {}
         for blob in blobs:
             file_name = blob.name.split('/')[-1]
             if file_name.endswith('.onnx') or file_name.endswith('.json'):
-                blob.download_to_filename(voices_folder + file_name)
+                files[blob.name] = voices_folder + file_name
+        self.download_many_to_files(files)
 
     def set_error(self, user_id: str, podcast_id: str):
         """Set podcast status to error"""
@@ -0,0 +1,106 @@
+# src/streaming.py
+
+import asyncio
+import logging
+import struct
+from typing import AsyncIterator, Optional, Tuple
+
+import anyio
+
+from src.assembly import AudioFormat, convert, open_wav, to_int16
+from src.intros import intro_bank
+from src.progress import PodcastProgress
+
+logger = logging.getLogger("uvicorn")
+
+POLL_INTERVAL = 0.5
+# Unknown length: the maximum RIFF sizes make players read until the connection closes
+STREAM_DATA_SIZE = 0xFFFFFFFF - 36
+
+
+def stream_header(audio_format: AudioFormat) -> bytes:
+    """
+    Build a .wav header for a stream of unknown length.
+
+    :param audio_format: The format of the stream.
+    :return: The header as bytes.
+    """
+    block_align = audio_format.channels * audio_format.sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 0xFFFFFFFF, b'WAVE',
+        b'fmt ', 16, 1, audio_format.channels, audio_format.sample_rate,
+        audio_format.sample_rate * block_align, block_align, audio_format.sample_width * 8,
+        b'data', STREAM_DATA_SIZE,
+    )
+
+
+def read_sentence(progress: PodcastProgress, line: int,
+                  audio_format: Optional[AudioFormat] = None) -> Optional[Tuple[AudioFormat, bytes]]:
+    """
+    Read a sentence from the spool of a job and decode its frames, blocking on disk and CPU.
+
+    :param progress: The progress of the podcast being generated.
+    :param line: The line number of the sentence.
+    :param audio_format: The format of the stream to convert the frames to, None to keep the sentence format.
+    :return: The format of the sentence and its frames in the stream format, or None if it is no longer stored.
+    """
+    wav_data = progress.read(line)
+    if wav_data is None:
+        return None
+    with open_wav(wav_data) as wav:
+        sentence_format = AudioFormat(wav.getframerate(), wav.getnchannels(), wav.getsampwidth())
+        frames = wav.readframes(wav.getnframes())
+    if audio_format is not None and sentence_format != audio_format:
+        samples = to_int16(frames, sentence_format)
+        frames = convert(samples, sentence_format.sample_rate, audio_format.sample_rate, audio_format.channels).tobytes()
+    return sentence_format, frames
+
+
+async def stream_podcast(progress: PodcastProgress) -> AsyncIterator[bytes]:
+    """
+    Stream a podcast as a chunked .wav file while it is being synthesized.
+
+    The intro is sent first, then every sentence as soon as it and all the lines before it are ready.
+    Sentences are read from the spool of the job one at a time, nothing is buffered for listeners.
+    Reading and decoding them runs in worker threads so the event loop is never blocked.
+
+    :param progress: The progress of the podcast being generated.
+    :return: An async iterator of .wav chunks.
+    """
+    progress.open_stream()
+    try:
+        # The format of the stream is the format of the first sentence
+        while not progress.lines and not progress.finished:
+            await asyncio.sleep(POLL_INTERVAL)
+        first = await anyio.to_thread.run_sync(read_sentence, progress, progress.lines[0]) if progress.lines else None
+        if first is None:
+            return
+
+        audio_format, frames = first
+        yield stream_header(audio_format)
+
+        intro = intro_bank.choice()
+        if intro is not None:
+            intro_rate, intro_samples = intro
+            intro_samples = await anyio.to_thread.run_sync(
+                convert, intro_samples, intro_rate, audio_format.sample_rate, audio_format.channels)
+            yield intro_samples.tobytes()
+        yield frames
+
+        sent = 1
+        while True:
+            ready = len(progress.lines)
+            for line in progress.lines[sent:ready]:
+                sentence = await anyio.to_thread.run_sync(read_sentence, progress, line, audio_format)
+                if sentence is None:
+                    logger.warning(f"Sentence {line} is no longer available, ending the stream")
+                    return
+                yield sentence[1]
+            sent = ready
+
+            if progress.finished and sent == len(progress.lines):
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        progress.close_stream()
@@ -0,0 +1,344 @@
+# src/synthesis.py
+
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.batching import BATCH_SIZE, synthesize_batch
+from src.cache import sentence_cache
+from src.chunking import CHUNK_PHONEMES, join_wavs, split_text
+from src.log import setup_logger
+from src.runtime import apply_worker_layout, layout_report
+from src.scheduler import SCHEDULER_INFLIGHT, FairScheduler
+from src.voices import VoiceRegistry, voice_fingerprint, voice_registry, voices
+
+logger = logging.getLogger("uvicorn")
+
+SYNTHESIS_WORKERS = int(os.getenv('TTS_SYNTHESIS_WORKERS', os.cpu_count() or 1))
+SYNTHESIS_POOL = os.getenv('TTS_SYNTHESIS_POOL', 'process')  # "process" or "thread"
+# Seconds to wait for every worker of the pool to load its voices at startup
+POOL_START_TIMEOUT = int(os.getenv('TTS_POOL_START_TIMEOUT', '600'))
+
+_worker_state = threading.local()
+
+
+def _worker_registry() -> VoiceRegistry:
+    """The voice registry owned by the current worker (thread workers get their own sessions)."""
+    return getattr(_worker_state, 'registry', None) or voice_registry
+
+
+_thread_workers = itertools.count()
+
+
+def _init_thread_worker(workers: int) -> None:
+    threads = apply_worker_layout(next(_thread_workers), workers)
+    _worker_state.registry = VoiceRegistry(voices, threads)
+    _worker_state.registry.load_all()
+
+
+def _init_process_worker(counter, workers: int) -> None:
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    # Spawned workers do not run the app, configure their logger so voice loading is reported
+    setup_logger("uvicorn")
+    # Each worker process has its own module state, so the global registry is private to it
+    voice_registry.threads = apply_worker_layout(index, workers)
+    voice_registry.load_all()
+
+
+def _worker_ready() -> Tuple[Tuple[int, int], Dict[str, Dict]]:
+    """
+    Run on a worker once its initializer is done, holding it briefly so the other workers take the next calls.
+
+    :return: The (process id, thread id) of the worker and the stats of its voices.
+    """
+    time.sleep(0.1)
+    return (os.getpid(), threading.get_ident()), _worker_registry().stats()
+
+
+def synthesize_sentence(voice_type: str, sentence: str) -> bytes:
+    """
+    Synthesize a single sentence into a .wav file.
+
+    :param voice_type: The type of voice to use ("male" or "female").
+    :param sentence: The sentence to synthesize.
+    :return: The .wav file as bytes.
+    """
+    voice = _worker_registry().get(voice_type)
+    buffer = BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        voice.synthesize(sentence, wav)
+    return buffer.getvalue()
+
+
+def count_phonemes(voice_type: str, text: str) -> int:
+    """
+    Count the phonemes Piper feeds the model for a text.
+
+    :param voice_type: The type of voice ("male" or "female").
+    :param text: The text.
+    :return: The number of phonemes, or the number of characters if the voice can not phonemize it.
+    """
+    try:
+        return sum(len(phonemes) for phonemes in voice_registry.phonemizer(voice_type).phonemize(text))
+    except Exception:
+        return len(text)
+
+
+def split_line(voice_type: str, sentence: str, budget: int = CHUNK_PHONEMES) -> List[str]:
+    """
+    Split an over-long line into chunks of at most `budget` phonemes.
+
+    :param voice_type: The type of voice ("male" or "female").
+    :param sentence: The line.
+    :param budget: The phoneme budget, 0 to never split.
+    :return: The chunks of the line, the line itself if it fits.
+    """
+    # Piper never produces many more phonemes than characters, short lines are not phonemized at all
+    if budget <= 0 or len(sentence) <= budget // 2:
+        return [sentence]
+    return split_text(sentence, budget, lambda text: count_phonemes(voice_type, text))
+
+
+def _synthesize_task(task: Tuple[Tuple[int, int], str, str]) -> Tuple[Tuple[int, int], Optional[bytes]]:
+    chunk, voice_type, sentence = task
+    try:
+        return chunk, synthesize_sentence(voice_type, sentence)
+    except Exception as e:
+        logger.error(f"Error in generating audio for sentence {chunk[0]}: {e}. Skipping to next sentence.")
+        return chunk, None
+
+
+def _synthesize_unit(unit: List[Tuple[Tuple[int, int], str, str]]) -> List[Tuple[Tuple[int, int], Optional[bytes]]]:
+    """
+    Synthesize a unit of work: a single chunk, or a batch of chunks of the same voice.
+    Chunks are identified by their (line number, chunk index).
+
+    A failed batch falls back to synthesizing its sentences one by one.
+    """
+    if len(unit) == 1:
+        return [_synthesize_task(unit[0])]
+
+    voice_type = unit[0][1]
+    try:
+        voice = _worker_registry().get(voice_type)
+        wav_files = synthesize_batch(voice, [sentence for _, _, sentence in unit])
+        return [(chunk, wav_data) for (chunk, _, _), wav_data in zip(unit, wav_files)]
+    except Exception as e:
+        logger.error(f"Error in batched synthesis of {len(unit)} sentences: {e}. Synthesizing them one by one.")
+        return [_synthesize_task(task) for task in unit]
+
+
+class SynthesisEngine:
+    """
+    Spreads independent sentences across a pool of workers, each one owning its own voice sessions.
+
+    With a single worker sentences are synthesized on one thread with the process-wide voices.
+    With a batch size above 1, sentences of the same voice are sent to workers in batches.
+    Work of concurrent jobs is interleaved by a fair scheduler, see FairScheduler.
+    """
+
+    def __init__(self, workers: int = SYNTHESIS_WORKERS, pool: str = SYNTHESIS_POOL, batch_size: int = BATCH_SIZE,
+                 inflight: int = SCHEDULER_INFLIGHT):
+        self.workers = max(1, workers)
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.worker_stats: Dict[Tuple[int, int], Dict[str, Dict]] = {}  # Voice stats of every pool worker
+        self.scheduler = FairScheduler(_synthesize_unit, self._get_executor, inflight or 2 * self.workers)
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.workers == 1:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='synthesis')
+                elif self.pool == 'thread':
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix='synthesis',
+                        initializer=_init_thread_worker,
+                        initargs=(self.workers,),
+                    )
+                else:
+                    # onnxruntime sessions do not survive a fork, start clean interpreters instead
+                    context = multiprocessing.get_context('spawn')
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=context,
+                        initializer=_init_process_worker,
+                        initargs=(context.Value('i', 0), self.workers),
+                    )
+                logger.info(f"Started synthesis pool with {self.workers} {self.pool} workers")
+            return self._executor
+
+    def start(self) -> None:
+        """
+        Load the voices and start the pool, waiting until every worker has loaded and warmed up its sessions,
+        so the first job does not pay for it.
+
+        Pool workers own their sessions, so this process only loads the voice configs to phonemize.
+        """
+        if self.workers == 1:
+            voice_registry.load_all()
+            self._get_executor()
+            return
+
+        voice_registry.load_phonemizers()
+        executor = self._get_executor()
+        # Workers only take calls once their initializer is done, keep calling until every worker answered
+        start_time = time.time()
+        while len(self.worker_stats) < self.workers and time.time() - start_time < POOL_START_TIMEOUT:
+            try:
+                calls = [executor.submit(_worker_ready) for _ in range(self.workers - len(self.worker_stats))]
+                self.worker_stats.update(call.result() for call in calls)
+            except Exception as e:
+                logger.error(f"Error starting the synthesis pool: {e}")
+                return
+        logger.info(f"{len(self.worker_stats)} of {self.workers} synthesis workers ready "
+                    f"in {time.time() - start_time:.2f}s")
+
+    def voice_stats(self) -> Dict[str, Dict]:
+        """
+        Load time and memory footprint of the voices the workers synthesize with.
+
+        Pool workers load their own sessions, so their stats are gathered by start(). Each voice reports
+        the stats of one worker, with the memory of the sessions of every worker and the slowest load.
+        """
+        if not self.worker_stats:
+            return voice_registry.stats()
+        stats: Dict[str, Dict] = {}
+        for worker_stats in self.worker_stats.values():
+            for voice_type, voice_stats in worker_stats.items():
+                if voice_type not in stats:
+                    stats[voice_type] = {**voice_stats, "workers": 1}
+                    continue
+                total = stats[voice_type]
+                total["workers"] += 1
+                total["memory_mb"] = round(total["memory_mb"] + voice_stats["memory_mb"], 1)
+                total["load_seconds"] = max(total["load_seconds"], voice_stats["load_seconds"])
+                total["warmup_seconds"] = max(total["warmup_seconds"], voice_stats["warmup_seconds"])
+        return stats
+
+    def layout(self) -> Dict:
+        """How the workers of the pool and their onnxruntime sessions are laid out on the host."""
+        return layout_report(self.workers, self.pool if self.workers > 1 else 'inline')
+
+    def synthesize_iter(self, lines: Dict[int, Tuple[str, str]], podcast_id: Optional[str] = None,
+                        user_id: Optional[str] = None) -> Iterator[Tuple[int, bytes]]:
+        """
+        Synthesize script lines in parallel, yielding each one as soon as it and every line before it is ready.
+
+        Lines found in the sentence cache are not synthesized again. Over-long lines are split into chunks
+        synthesized as independent units, then joined back with short crossfades.
+
+        :param lines: A dictionary where keys are line numbers and values are (voice type, sentence) tuples.
+        :param podcast_id: The podcast the lines belong to, reported in the scheduler stats.
+        :param user_id: The user of the job, to apply its priority.
+        :return: An iterator of (line number, .wav file as bytes) tuples in line order.
+                 Lines that failed to synthesize are left out.
+        """
+        fingerprints = {}
+        keys = {}
+        cached = {}
+        tasks = []
+        chunk_counts = {}
+        for line, (voice_type, sentence) in sorted(lines.items()):
+            if voice_type not in fingerprints and sentence_cache is not None:
+                try:
+                    fingerprints[voice_type] = voice_fingerprint(voice_type)
+                except OSError as e:
+                    logger.error(f"Error fingerprinting voice {voice_type}, not caching it: {e}")
+                    fingerprints[voice_type] = None
+            if fingerprints.get(voice_type) is not None:
+                keys[line] = sentence_cache.key(fingerprints[voice_type], sentence)
+                wav_data = sentence_cache.get(keys[line])
+                if wav_data is not None:
+                    cached[line] = wav_data
+                    continue
+            chunks = split_line(voice_type, sentence)
+            chunk_counts[line] = len(chunks)
+            tasks.extend(((line, index), voice_type, chunk) for index, chunk in enumerate(chunks))
+
+        if cached:
+            logger.info(f"Found {len(cached)} of {len(lines)} sentences in the sentence cache")
+        if len(tasks) > len(chunk_counts):
+            logger.info(f"Split {sum(1 for count in chunk_counts.values() if count > 1)} long sentences "
+                        f"into {len(tasks) - len(chunk_counts)} extra chunks")
+
+        # Group the chunks of each voice into batches, in line order so the first lines are ready first
+        units = []
+        if self.batch_size > 1:
+            open_units: Dict[str, List] = {}
+            for task in tasks:
+                unit = open_units.setdefault(task[1], [])
+                if not unit:
+                    units.append(unit)
+                unit.append(task)
+                if len(unit) == self.batch_size:
+                    del open_units[task[1]]
+        else:
+            units = [[task] for task in tasks]
+
+        # Every call is its own scheduler job, so that finishing or cancelling it never touches another run
+        job_id = f"synthesis-{uuid.uuid4().hex}"
+        futures = dict(zip((id(unit) for unit in units), self.scheduler.submit(units, job_id, user_id, podcast_id))) if units else {}
+        unit_of_chunk = {chunk: unit for unit in units for chunk, _, _ in unit}
+        results: Dict[Tuple[int, int], Optional[bytes]] = {}
+
+        # Yield the cached lines and the synthesized ones back in line order
+        try:
+            for line in sorted(lines):
+                if line in cached:
+                    yield line, cached[line]
+                    continue
+
+                chunks = [(line, index) for index in range(chunk_counts[line])]
+                for chunk in chunks:
+                    if chunk not in results:
+                        results.update(futures[id(unit_of_chunk[chunk])].result())
+
+                wav_files = [results.pop(chunk) for chunk in chunks]
+                if any(wav_data is None for wav_data in wav_files):
+                    continue
+                try:
+                    wav_data = join_wavs(wav_files)
+                except Exception as e:
+                    logger.error(f"Error joining the chunks of sentence {line}: {e}. Skipping to next sentence.")
+                    continue
+                if line in keys:
+                    sentence_cache.put(keys[line], wav_data)
+                yield line, wav_data
+        finally:
+            # Do not keep synthesizing for a caller that went away
+            if futures:
+                self.scheduler.cancel(job_id)
+
+    def synthesize(self, lines: Dict[int, Tuple[str, str]]) -> Dict[int, bytes]:
+        """
+        Synthesize script lines in parallel.
+
+        :param lines: A dictionary where keys are line numbers and values are (voice type, sentence) tuples.
+        :return: A dictionary where keys are line numbers, in line order, and values are .wav files as bytes.
+                 Lines that failed to synthesize are left out.
+        """
+        return dict(self.synthesize_iter(lines))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            self.worker_stats.clear()
+
+
+synthesis_engine = SynthesisEngine()
@@ -0,0 +1,229 @@
+# src/voices.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import piper
+import psutil
+from piper.config import PiperConfig
+
+from src.batching import BATCH_PADDING, BATCH_SIZE
+from src.chunking import CHUNK_CROSSFADE_MS, CHUNK_PHONEMES
+from src.runtime import create_session
+
+logger = logging.getLogger("uvicorn")
+
+voices_folder = 'voices/'
+"""
+voices = {
+    "male": (voices_folder + "en_US-libritts-high.onnx", voices_folder + "en_US-libritts-high.onnx.json"),
+    "female": (voices_folder + "en_GB-northern_english_male-medium.onnx", voices_folder + "en_GB-northern_english_male-medium.onnx.json")
+}
+"""
+voices = {
+    "male": (voices_folder + "male.onnx", voices_folder + "male.json"),
+    "female": (voices_folder + "female.onnx", voices_folder + "female.json")
+}
+
+WARMUP_TEXT = "Hello."
+
+# Model variant of each voice, e.g. "male:int8,female:float", or "int8" for every voice.
+# "float" is the original model, other variants are made by scripts/quantize_voices.py next to it.
+VOICE_VARIANTS = os.getenv('TTS_VOICE_VARIANTS', 'float')
+
+
+def parse_variants(variants: str) -> Dict[str, str]:
+    """
+    Parse the model variant setting.
+
+    :param variants: A "voice:variant,voice:variant" list, or a single variant for every voice.
+    :return: The variant of every voice type.
+    """
+    parsed = {}
+    for item in variants.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if ':' in item:
+            voice_type, variant = item.split(':', 1)
+            parsed[voice_type.strip()] = variant.strip()
+        else:
+            parsed.update({voice_type: item for voice_type in voices})
+    return parsed
+
+
+def variant_path(model_path: str, variant: str) -> str:
+    """
+    The model file of a variant, e.g. voices/male.onnx becomes voices/male.int8.onnx.
+
+    :param model_path: The path of the original model.
+    :param variant: The variant.
+    :return: The path of the variant's model.
+    """
+    if variant == 'float':
+        return model_path
+    root, extension = os.path.splitext(model_path)
+    return f"{root}.{variant}{extension}"
+
+
+def resolve_model(voice_type: str, voice_paths: Optional[Dict[str, Tuple[str, str]]] = None) -> Tuple[str, str]:
+    """
+    The model to load for a voice, falling back to the original model if its variant was not generated.
+
+    :param voice_type: The type of voice ("male" or "female").
+    :param voice_paths: The model and config paths of every voice type.
+    :return: The (variant, model path) of the voice.
+    """
+    model_path = (voice_paths or voices)[voice_type][0]
+    variant = parse_variants(VOICE_VARIANTS).get(voice_type, 'float')
+    path = variant_path(model_path, variant)
+    if variant != 'float' and not os.path.exists(path):
+        logger.warning(f"Model {path} of the {variant} variant of voice {voice_type} not found, using {model_path}")
+        return 'float', model_path
+    return variant, path
+
+
+def voice_fingerprint(voice_type: str) -> str:
+    """
+    Digest identifying a voice model and its synthesis settings.
+
+    The model is identified by its path, size and modification time, the settings by the content of
+    its config file, so replacing either one changes the fingerprint. Chunking and batching settings
+    are included too, since chunks are crossfaded and batched sentences get their padding trimmed.
+
+    :param voice_type: The type of voice ("male" or "female").
+    :return: The fingerprint as a hex string.
+    """
+    _, model_path = resolve_model(voice_type)
+    config_path = voices[voice_type][1]
+    model_stat = os.stat(model_path)
+    digest = hashlib.sha256(f"{model_path}:{model_stat.st_size}:{model_stat.st_mtime_ns}".encode('utf-8'))
+    with open(config_path, 'rb') as config_file:
+        digest.update(config_file.read())
+    digest.update(f"chunking:{CHUNK_PHONEMES}:{CHUNK_CROSSFADE_MS}".encode('utf-8'))
+    if BATCH_SIZE > 1:
+        digest.update(f"batching:{BATCH_SIZE}:{BATCH_PADDING}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class VoiceRegistry:
+    """
+    Keeps one loaded Piper voice per voice type for the lifetime of the process.
+
+    Loading a voice parses the ONNX model and builds an onnxruntime session, which is far
+    more expensive than synthesizing a sentence, so every sentence and every job shares the
+    same session.
+    """
+
+    def __init__(self, voice_paths: Dict[str, Tuple[str, str]], threads: Optional[int] = None):
+        self.voice_paths = voice_paths
+        self.threads = threads  # Intra-op threads of the sessions, None for the configured default
+        self._voices: Dict[str, piper.PiperVoice] = {}
+        self._phonemizers: Dict[str, piper.PiperVoice] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def load(self, voice_type: str) -> piper.PiperVoice:
+        """
+        Load, warm up and register a voice. Already loaded voices are returned as is.
+
+        :param voice_type: The type of voice to load ("male" or "female").
+        :return: The loaded PiperVoice.
+        """
+        with self._lock:
+            if voice_type in self._voices:
+                return self._voices[voice_type]
+
+            variant, model_path = resolve_model(voice_type, self.voice_paths)
+            process = psutil.Process()
+            rss_before = process.memory_info().rss
+            start_time = time.time()
+
+            logger.debug(f"Loading voice {voice_type} from {model_path}")
+            voice = piper.PiperVoice(config=self._load_config(voice_type), session=create_session(model_path, self.threads))
+            load_time = time.time() - start_time
+
+            # A first inference allocates the session buffers, do it before a real job pays for it
+            warmup_start = time.time()
+            for _ in voice.synthesize_stream_raw(WARMUP_TEXT):
+                pass
+            warmup_time = time.time() - warmup_start
+
+            self._stats[voice_type] = {
+                "model": model_path,
+                "variant": variant,
+                "intra_op_threads": voice.session.get_session_options().intra_op_num_threads,
+                "providers": voice.session.get_providers(),
+                "sample_rate": voice.config.sample_rate,
+                "load_seconds": round(load_time, 3),
+                "warmup_seconds": round(warmup_time, 3),
+                "memory_mb": round((process.memory_info().rss - rss_before) / (1024 * 1024), 1),
+            }
+            logger.info(
+                f"Loaded voice {voice_type} in {load_time:.2f}s "
+                f"(warmup {warmup_time:.2f}s, {self._stats[voice_type]['memory_mb']} MB)"
+            )
+
+            self._voices[voice_type] = voice
+            return voice
+
+    def _load_config(self, voice_type: str) -> PiperConfig:
+        with open(self.voice_paths[voice_type][1], 'r', encoding='utf-8') as config_file:
+            return PiperConfig.from_dict(json.load(config_file))
+
+    def phonemizer(self, voice_type: str) -> piper.PiperVoice:
+        """
+        Get a voice that can phonemize text, without building an onnxruntime session for it.
+
+        :param voice_type: The type of voice ("male" or "female").
+        :return: The loaded voice if there is one, otherwise a voice with only its config.
+        """
+        voice = self._voices.get(voice_type) or self._phonemizers.get(voice_type)
+        if voice is None:
+            with self._lock:
+                voice = self._phonemizers.get(voice_type)
+                if voice is None:
+                    # Phonemizing only needs the config, the session is never used
+                    voice = piper.PiperVoice(config=self._load_config(voice_type), session=None)
+                    self._phonemizers[voice_type] = voice
+        return voice
+
+    def load_phonemizers(self) -> None:
+        """Load the config of every configured voice, for processes that phonemize but never synthesize."""
+        for voice_type in self.voice_paths:
+            try:
+                self.phonemizer(voice_type)
+            except Exception as e:
+                logger.error(f"Error loading the config of voice {voice_type}: {e}")
+
+    def load_all(self) -> None:
+        """Load every configured voice."""
+        for voice_type in self.voice_paths:
+            try:
+                self.load(voice_type)
+            except Exception as e:
+                logger.error(f"Error loading voice {voice_type}: {e}")
+
+    def get(self, voice_type: str) -> piper.PiperVoice:
+        """
+        Get a loaded voice, loading it on first use.
+
+        :param voice_type: The type of voice ("male" or "female").
+        :return: The loaded PiperVoice.
+        """
+        voice = self._voices.get(voice_type)
+        if voice is None:
+            voice = self.load(voice_type)
+        return voice
+
+    def stats(self) -> Dict[str, Dict]:
+        """Load time and memory footprint of every loaded voice."""
+        return dict(self._stats)
+
+
+voice_registry = VoiceRegistry(voices)
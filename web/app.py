@@ -284,7 +284,8 @@ async def get_audio(request: Request, podcast_id: str):
         if not audio_data:
             raise HTTPException(status_code=404, detail="Audio not found")
         else:
-            return StreamingResponse(iter([audio_data]), media_type="audio/mpeg")
+            media_type = response.headers.get("content-type", "audio/mpeg")
+            return StreamingResponse(iter([audio_data]), media_type=media_type)
 
 
 @app.get("/like_podcast/{podcast_id}")